@@ -4,8 +4,6 @@ from loguru import logger
 from .agents.agent_interface import AgentInterface
 from .agents.basic_memory_agent import BasicMemoryAgent
 from .stateless_llm_factory import LLMFactory as StatelessLLMFactory
-from .agents.hume_ai import HumeAIAgent
-from .agents.travel_agent import TravelAgent
 
 class AgentFactory:
     @staticmethod
@@ -91,6 +89,8 @@ class AgentFactory:
             )
 
         elif conversation_agent_choice == "hume_ai_agent":
+            from .agents.hume_ai import HumeAIAgent
+
             settings = agent_settings.get("hume_ai_agent", {})
             return HumeAIAgent(
                 api_key=settings.get("api_key"),
@@ -100,6 +100,8 @@ class AgentFactory:
             )
 
         elif conversation_agent_choice == "travel_agent":
+            from .agents.travel_agent import TravelAgent
+
             travel_settings = agent_settings.get("travel_agent", {})
             llm_provider = travel_settings.get("llm_provider")
             if llm_provider is None:
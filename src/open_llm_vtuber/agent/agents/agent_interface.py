@@ -9,6 +9,9 @@ from ..input_types import BaseInput
 class AgentInterface(ABC):
     """Base interface for all agent implementations"""
 
+    # Empty slots so that subclasses may declare __slots__ of their own
+    __slots__ = ()
+
     @abstractmethod
     async def chat(self, input_data: BaseInput) -> AsyncIterator[BaseOutput]:
         """
@@ -1,10 +1,8 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import os
-import json
-import requests
 from loguru import logger
 from dotenv import load_dotenv
-from .tool_base import ToolBase
+from .tool_base import ToolBase, dump_result, get_session
 
 # 加载环境变量
 load_dotenv()
@@ -30,6 +28,44 @@ class InfrastructureTool(ToolBase):
         "邮局": "110000",      # 邮政电信服务
     }
     
+    # 参数定义是静态数据，类加载时构建一次
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "location": {
+                "type": "string",
+                "description": "查询位置，可以是城市名、地址或地标，如：北京、上海市浦东新区、天安门广场等"
+            },
+            "infrastructure_type": {
+                "type": "string",
+                "description": f"基础设施类型，支持：{', '.join(POI_TYPES.keys())}",
+                "enum": tuple(POI_TYPES)
+            },
+            "radius": {
+                "type": "integer",
+                "description": "搜索半径（米），默认3000米，最大10000米",
+                "default": 3000,
+                "minimum": 100,
+                "maximum": 10000
+            },
+            "limit": {
+                "type": "integer",
+                "description": "返回结果数量限制，默认5个，最大10个",
+                "default": 5,
+                "minimum": 1,
+                "maximum": 10
+            }
+        },
+        "required": ("location", "infrastructure_type")
+    }
+    
+    def __init__(self, api_key: Optional[str] = None):
+        """
+        Args:
+            api_key: 高德地图 API Key，默认使用环境变量 AMAP_API_KEY
+        """
+        self._api_key = api_key or AMAP_API_KEY
+    
     @property
     def name(self) -> str:
         return "search_nearby_infrastructure"
@@ -40,49 +76,21 @@ class InfrastructureTool(ToolBase):
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "location": {
-                    "type": "string",
-                    "description": "查询位置，可以是城市名、地址或地标，如：北京、上海市浦东新区、天安门广场等"
-                },
-                "infrastructure_type": {
-                    "type": "string",
-                    "description": f"基础设施类型，支持：{', '.join(self.POI_TYPES.keys())}",
-                    "enum": list(self.POI_TYPES.keys())
-                },
-                "radius": {
-                    "type": "integer",
-                    "description": "搜索半径（米），默认3000米，最大10000米",
-                    "default": 3000,
-                    "minimum": 100,
-                    "maximum": 10000
-                },
-                "limit": {
-                    "type": "integer",
-                    "description": "返回结果数量限制，默认5个，最大10个",
-                    "default": 5,
-                    "minimum": 1,
-                    "maximum": 10
-                }
-            },
-            "required": ["location", "infrastructure_type"]
-        }
+        return self._PARAMETERS
     
     def execute(self, location: str, infrastructure_type: str, radius: int = 3000, limit: int = 10) -> str:
         """执行周边基础设施查询"""
         try:
             # 验证基础设施类型
             if infrastructure_type not in self.POI_TYPES:
-                return json.dumps({
+                return dump_result({
                     "error": f"不支持的基础设施类型: {infrastructure_type}，支持的类型：{', '.join(self.POI_TYPES.keys())}"
-                }, ensure_ascii=False)
+                })
             
             # 获取位置的经纬度坐标
             coordinates = self._get_coordinates(location)
             if not coordinates:
-                return json.dumps({"error": f"无法获取位置坐标: {location}"}, ensure_ascii=False)
+                return dump_result({"error": f"无法获取位置坐标: {location}"})
             
             # 获取POI类型代码
             poi_type = self.POI_TYPES[infrastructure_type]
@@ -91,24 +99,24 @@ class InfrastructureTool(ToolBase):
             result = self._search_nearby_poi(coordinates, poi_type, radius, limit)
             
             if result.get("error"):
-                return json.dumps(result, ensure_ascii=False)
+                return dump_result(result)
             
             # 格式化返回结果
             formatted_result = self._format_result(location, infrastructure_type, radius, result)
-            return json.dumps(formatted_result, ensure_ascii=False)
+            return dump_result(formatted_result)
             
         except Exception as e:
-            logger.error(f"周边基础设施查询出错: {str(e)}")
-            return json.dumps({"error": f"查询失败: {str(e)}"}, ensure_ascii=False)
+            logger.error("周边基础设施查询出错: {}", e)
+            return dump_result({"error": f"查询失败: {str(e)}"})
     
     def _get_coordinates(self, location: str) -> str:
         """获取位置的经纬度坐标"""
         try:
             # 使用高德地图地理编码API
-            geo_response = requests.get(
+            geo_response = get_session().get(
                 "https://restapi.amap.com/v3/geocode/geo",
                 params={
-                    "key": AMAP_API_KEY,
+                    "key": self._api_key,
                     "address": location
                 },
                 timeout=5
@@ -117,24 +125,24 @@ class InfrastructureTool(ToolBase):
             geo_data = geo_response.json()
             
             if geo_data.get("status") != "1" or not geo_data.get("geocodes"):
-                logger.error(f"地理编码失败: {location}")
+                logger.error("地理编码失败: {}", location)
                 return None
             
             # 返回经纬度坐标（格式："经度,纬度"）
             return geo_data["geocodes"][0]["location"]
             
         except Exception as e:
-            logger.error(f"获取坐标失败: {str(e)}")
+            logger.error("获取坐标失败: {}", e)
             return None
     
     def _search_nearby_poi(self, coordinates: str, poi_type: str, radius: int, limit: int) -> Dict[str, Any]:
         """搜索周边POI"""
         try:
             # 调用高德地图周边搜索API
-            response = requests.get(
+            response = get_session().get(
                 "https://restapi.amap.com/v3/place/around",
                 params={
-                    "key": AMAP_API_KEY,
+                    "key": self._api_key,
                     "location": coordinates,
                     "types": poi_type,
                     "radius": radius,
@@ -153,7 +161,7 @@ class InfrastructureTool(ToolBase):
             return data
             
         except Exception as e:
-            logger.error(f"POI搜索失败: {str(e)}")
+            logger.error("POI搜索失败: {}", e)
             return {"error": f"搜索请求失败: {str(e)}"}
     
     def _format_result(self, location: str, infrastructure_type: str, radius: int, api_result: Dict[str, Any]) -> Dict[str, Any]:
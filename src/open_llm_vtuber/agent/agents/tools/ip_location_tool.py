@@ -1,11 +1,9 @@
 import os
-import json
-import requests
 import re
 from typing import Dict, Any, Optional
 from loguru import logger
 from dotenv import load_dotenv
-from .tool_base import ToolBase
+from .tool_base import ToolBase, dump_result, get_session
 
 # 加载环境变量
 load_dotenv()
@@ -14,6 +12,32 @@ AMAP_API_KEY = os.getenv("AMAP_API_KEY")
 class IPLocationTool(ToolBase):
     """IP定位查询工具"""
     
+    # 参数定义是静态数据，类加载时构建一次
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "ip": {
+                "type": "string",
+                "description": "需要查询的IP地址（仅支持国内IP）。格式如：'114.247.50.2'。如果不填写，则自动定位当前请求方的IP位置",
+                "pattern": r"^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$"
+            },
+            "output": {
+                "type": "string",
+                "description": "返回数据格式，可选值：json、xml，默认为json",
+                "default": "json",
+                "enum": ("json", "xml")
+            }
+        },
+        "required": ()
+    }
+    
+    def __init__(self, api_key: Optional[str] = None):
+        """
+        Args:
+            api_key: 高德地图 API Key，默认使用环境变量 AMAP_API_KEY
+        """
+        self._api_key = api_key or AMAP_API_KEY
+    
     @property
     def name(self) -> str:
         return "get_ip_location"
@@ -24,60 +48,44 @@ class IPLocationTool(ToolBase):
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "ip": {
-                    "type": "string",
-                    "description": "需要查询的IP地址（仅支持国内IP）。格式如：'114.247.50.2'。如果不填写，则自动定位当前请求方的IP位置",
-                    "pattern": r"^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$"
-                },
-                "output": {
-                    "type": "string",
-                    "description": "返回数据格式，可选值：json、xml，默认为json",
-                    "default": "json",
-                    "enum": ["json", "xml"]
-                }
-            },
-            "required": []
-        }
+        return self._PARAMETERS
     
     def execute(self, ip: str = None, output: str = "json") -> str:
         """执行IP定位查询"""
         try:
             # 验证API密钥
-            if not AMAP_API_KEY:
-                return json.dumps({"error": "未配置高德地图API密钥，请在.env文件中设置AMAP_API_KEY"}, ensure_ascii=False)
+            if not self._api_key:
+                return dump_result({"error": "未配置高德地图API密钥，请在.env文件中设置AMAP_API_KEY"})
             
             # 如果没有提供IP，尝试获取公网IP
             if not ip:
                 public_ip = self._get_public_ip()
                 if public_ip:
                     ip = public_ip
-                    logger.info(f"自动获取到公网IP: {ip}")
+                    logger.info("自动获取到公网IP: {}", ip)
                 else:
                     logger.warning("无法获取公网IP，将使用服务器本地IP进行查询")
             
             # 验证IP地址格式（如果提供了IP）
             if ip and not self._validate_ip(ip):
-                return json.dumps({"error": "IP地址格式错误，请提供有效的IPv4地址"}, ensure_ascii=False)
+                return dump_result({"error": "IP地址格式错误，请提供有效的IPv4地址"})
             
             # 验证输出格式
             if output.lower() not in ["json", "xml"]:
-                return json.dumps({"error": "输出格式错误，仅支持json或xml"}, ensure_ascii=False)
+                return dump_result({"error": "输出格式错误，仅支持json或xml"})
             
             # 获取IP定位数据
             location_data = self._get_ip_location(ip, output.lower())
             if location_data.get("error"):
-                return json.dumps(location_data, ensure_ascii=False)
+                return dump_result(location_data)
             
             # 格式化返回结果
             formatted_result = self._format_location_result(location_data)
-            return json.dumps(formatted_result, ensure_ascii=False)
+            return dump_result(formatted_result)
             
         except Exception as e:
-            logger.error(f"IP定位查询出错: {str(e)}")
-            return json.dumps({"error": f"IP定位查询失败: {str(e)}"}, ensure_ascii=False)
+            logger.error("IP定位查询出错: {}", e)
+            return dump_result({"error": f"IP定位查询失败: {str(e)}"})
     
     def _get_public_ip(self) -> Optional[str]:
         """获取服务器的公网IP地址"""
@@ -91,14 +99,14 @@ class IPLocationTool(ToolBase):
         
         for service in ip_services:
             try:
-                response = requests.get(service, timeout=5)
+                response = get_session().get(service, timeout=5)
                 if response.status_code == 200:
                     ip = response.text.strip()
                     if self._validate_ip(ip):
-                        logger.debug(f"从 {service} 获取到公网IP: {ip}")
+                        logger.debug("从 {} 获取到公网IP: {}", service, ip)
                         return ip
             except Exception as e:
-                logger.debug(f"从 {service} 获取公网IP失败: {e}")
+                logger.debug("从 {} 获取公网IP失败: {}", service, e)
                 continue
         
         logger.warning("无法从任何服务获取公网IP")
@@ -133,7 +141,7 @@ class IPLocationTool(ToolBase):
         try:
             # 构建请求参数
             params = {
-                "key": AMAP_API_KEY,
+                "key": self._api_key,
                 "output": output
             }
             
@@ -141,9 +149,9 @@ class IPLocationTool(ToolBase):
             if ip:
                 params["ip"] = ip
             
-            logger.debug(f"IP定位API请求参数: {params}")
+            logger.debug("IP定位API请求参数: {}", params)
             
-            response = requests.get(
+            response = get_session().get(
                 "https://restapi.amap.com/v3/ip",
                 params=params,
                 timeout=10
@@ -152,8 +160,8 @@ class IPLocationTool(ToolBase):
             # 检查HTTP状态码
             response.raise_for_status()
             
-            logger.debug(f"IP定位API响应状态码: {response.status_code}")
-            logger.debug(f"IP定位API响应内容: {response.text}")
+            logger.debug("IP定位API响应状态码: {}", response.status_code)
+            logger.opt(lazy=True).debug("IP定位API响应内容: {}", lambda: response.text)
             
             # 根据输出格式解析响应
             if output == "json":
@@ -165,13 +173,13 @@ class IPLocationTool(ToolBase):
             if location_data.get("status") != "1":
                 error_msg = location_data.get("info", "未知错误")
                 error_code = location_data.get("infocode", "")
-                logger.error(f"高德地图API调用失败: {error_msg} (错误码: {error_code})")
+                logger.error("高德地图API调用失败: {} (错误码: {})", error_msg, error_code)
                 return {"error": f"API调用失败: {error_msg} (错误码: {error_code})"}
             
             return location_data
             
         except Exception as e:
-            logger.error(f"获取IP定位数据时出错: {str(e)}")
+            logger.error("获取IP定位数据时出错: {}", e)
             return {"error": f"获取IP定位数据时出错: {str(e)}"}
     
     def _format_location_result(self, location_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -206,7 +214,10 @@ class IPLocationTool(ToolBase):
             elif not isinstance(rectangle, str):
                 rectangle = str(rectangle) if rectangle else ""
             
-            logger.debug(f"处理后的位置信息 - province: '{province}', city: '{city}', adcode: '{adcode}', rectangle: '{rectangle}'")
+            logger.debug(
+                "处理后的位置信息 - province: '{}', city: '{}', adcode: '{}', rectangle: '{}'",
+                province, city, adcode, rectangle,
+            )
             
             # 解析矩形区域坐标
             rectangle_info = None
@@ -228,7 +239,7 @@ class IPLocationTool(ToolBase):
                                 }
                             }
                 except (ValueError, IndexError) as e:
-                    logger.warning(f"解析矩形区域坐标失败: {rectangle}, 错误: {e}")
+                    logger.warning("解析矩形区域坐标失败: {}, 错误: {}", rectangle, e)
             
             # 判断位置类型和构建描述
             location_type = "unknown"
@@ -267,7 +278,7 @@ class IPLocationTool(ToolBase):
             }
             
         except Exception as e:
-            logger.error(f"格式化IP定位数据时出错: {str(e)}")
+            logger.error("格式化IP定位数据时出错: {}", e)
             return {"error": f"数据格式化失败: {str(e)}"}
     
     def get_current_location(self) -> str:
@@ -1,6 +1,41 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List
+import asyncio
 import json
+import sys
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+# 工具同步实现共享的 requests 会话，在线程池中并发执行时复用连接
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """获取工具共享的 requests.Session，首次使用时创建"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # 连接池大小与并发执行的工具数量相当
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def dump_result(result: Any) -> str:
+    """
+    将工具结果序列化为紧凑的 JSON 字符串
+
+    结果会原样作为 tool 消息发送给 LLM，去掉分隔符后的空格可以减少 token 数。
+    """
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+
 
 class ToolBase(ABC):
     """工具基类"""
@@ -28,6 +63,10 @@ class ToolBase(ABC):
         """执行工具"""
         pass
     
+    async def aexecute(self, **kwargs) -> str:
+        """异步执行工具，默认在线程池中运行 execute，子类可提供原生异步实现"""
+        return await asyncio.to_thread(self.execute, **kwargs)
+    
     def to_function_definition(self) -> Dict[str, Any]:
         """转换为 DeepSeek Function Calling 格式"""
         return {
@@ -42,13 +81,19 @@ class ToolBase(ABC):
 class ToolManager:
     """工具管理器"""
     
+    __slots__ = ("_tools", "_definitions", "_definitions_json")
+    
     def __init__(self):
         self._tools: Dict[str, ToolBase] = {}
+        self._definitions: List[Dict[str, Any]] | None = None
+        self._definitions_json: str | None = None
     
     def register_tool(self, tool: ToolBase):
         """注册工具"""
-        self._tools[tool.name] = tool
-        print(f"🔧 [DEBUG] 注册工具: {tool.name}")
+        self._tools[sys.intern(tool.name)] = tool
+        self._definitions = None
+        self._definitions_json = None
+        logger.debug("注册工具: {}", tool.name)
     
     def get_tool(self, name: str) -> ToolBase:
         """获取工具"""
@@ -59,21 +104,55 @@ class ToolManager:
         return list(self._tools.values())
     
     def get_function_definitions(self) -> List[Dict[str, Any]]:
-        """获取所有工具的函数定义"""
-        return [tool.to_function_definition() for tool in self._tools.values()]
+        """
+        获取所有工具的函数定义
+
+        定义在注册工具后首次调用时构建并缓存，调用方不应修改返回的列表。
+        """
+        if self._definitions is None:
+            self._definitions = [tool.to_function_definition() for tool in self._tools.values()]
+        return self._definitions
+    
+    def get_function_definitions_json(self) -> str:
+        """
+        获取序列化后的函数定义 JSON
+
+        工具定义在每次请求中都不变，序列化一次后可直接拼接进请求体。
+        """
+        if self._definitions_json is None:
+            self._definitions_json = json.dumps(
+                self.get_function_definitions(), ensure_ascii=False, separators=(",", ":")
+            )
+        return self._definitions_json
     
     def execute_tool(self, name: str, arguments: Dict[str, Any]) -> str:
         """执行工具"""
-        tool = self.get_tool(name)
+        tool = self._tools.get(name)
         if not tool:
-            return json.dumps({"error": f"未知工具: {name}"}, ensure_ascii=False)
+            return dump_result({"error": f"未知工具: {name}"})
         
         try:
-            print(f"🔧 [DEBUG] 执行工具: {name}，参数: {arguments}")
+            logger.debug("执行工具: {}，参数: {}", name, arguments)
             result = tool.execute(**arguments)
-            print(f"🔧 [DEBUG] 工具执行结果: {result[:100]}...")
+            logger.debug("工具执行结果: {}...", result[:100])
+            return result
+        except Exception as e:
+            error_msg = f"工具执行失败: {str(e)}"
+            logger.error(error_msg)
+            return dump_result({"error": error_msg})
+    
+    async def aexecute_tool(self, name: str, arguments: Dict[str, Any]) -> str:
+        """异步执行工具"""
+        tool = self._tools.get(name)
+        if not tool:
+            return dump_result({"error": f"未知工具: {name}"})
+        
+        try:
+            logger.debug("异步执行工具: {}，参数: {}", name, arguments)
+            result = await tool.aexecute(**arguments)
+            logger.debug("工具执行结果: {}...", result[:100])
             return result
         except Exception as e:
             error_msg = f"工具执行失败: {str(e)}"
-            print(f"ERROR [DEBUG] {error_msg}")
-            return json.dumps({"error": error_msg}, ensure_ascii=False)
\ No newline at end of file
+            logger.error(error_msg)
+            return dump_result({"error": error_msg})
\ No newline at end of file
@@ -2,10 +2,11 @@ import os
 import json
 import requests
 import math
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from loguru import logger
 from dotenv import load_dotenv
-from .tool_base import ToolBase
+from .tool_base import ToolBase, dump_result, get_session
+from ....utils.keyword_matcher import KeywordMatcher
 
 # 加载环境变量
 load_dotenv()
@@ -22,6 +23,65 @@ class TrafficTool(ToolBase):
         "绍兴", "重庆", "泉州", "惠州", "中山", "无锡", "广州", "嘉兴", "北京", "金华"
     ]
     
+    # 关键词匹配器在类加载时构建一次，每次查询只需扫描一遍文本
+    _SUPPORTED_CITY_MATCHER = KeywordMatcher(SUPPORTED_CITIES)
+    
+    # 各城市默认查询的矩形范围
+    _CITY_RECTANGLES = {
+        "上海": "121.3574,31.1718;121.5810,31.3076",  # 上海市中心区域，约5公里范围
+        "北京": "116.2844,39.8493;116.4733,39.9850",  # 北京市中心区域
+        "广州": "113.1943,23.0669;113.3840,23.1966",  # 广州市中心区域
+        "深圳": "114.0579,22.5178;114.2577,22.6475",  # 深圳市中心区域
+        "杭州": "120.0791,30.2084;120.2688,30.3381",  # 杭州市中心区域
+        "南京": "118.7073,32.0162;118.8970,32.1459",  # 南京市中心区域
+        "武汉": "114.2049,30.5370;114.3946,30.6667",  # 武汉市中心区域
+        "西安": "108.8400,34.2000;109.0400,34.3300",  # 西安市中心区域
+        "成都": "104.0100,30.6000;104.2100,30.7300",  # 成都市中心区域
+        "重庆": "106.4500,29.5000;106.6500,29.6300",  # 重庆市中心区域
+        "天津": "117.1000,39.0000;117.3000,39.1300",  # 天津市中心区域
+        "苏州": "120.5000,31.2000;120.7000,31.3300",  # 苏州市中心区域
+    }
+    _CITY_RECTANGLE_MATCHER = KeywordMatcher(_CITY_RECTANGLES)
+    
+    # 道路名中表示高速、快速路等主干道的关键词
+    _HIGHWAY_MATCHER = KeywordMatcher(["高速", "快速路", "环线", "立交"])
+    
+    # 参数定义是静态数据，类加载时构建一次
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "city": {
+                "type": "string",
+                "description": "城市名称，如：上海、北京、广州等。系统会自动为该城市生成合适的查询范围"
+            },
+            "rectangle": {
+                "type": "string",
+                "description": "可选：自定义矩形区域范围，格式为'左下角经度,左下角纬度;右上角经度,右上角纬度'。如不提供，将使用城市默认范围"
+            },
+            "level": {
+                "type": "integer",
+                "description": "道路等级过滤，1=主要道路，6=所有道路，默认为1",
+                "default": 1,
+                "minimum": 0,
+                "maximum": 6
+            },
+            "extensions": {
+                "type": "string",
+                "description": "返回结果控制，base=基本信息，all=全部信息，默认为base",
+                "default": "base",
+                "enum": ("base", "all")
+            }
+        },
+        "required": ("city",)
+    }
+    
+    def __init__(self, api_key: Optional[str] = None):
+        """
+        Args:
+            api_key: 高德地图 API Key，默认使用环境变量 AMAP_API_KEY
+        """
+        self._api_key = api_key or AMAP_API_KEY
+    
     @property
     def name(self) -> str:
         return "get_traffic_status"
@@ -32,106 +92,60 @@ class TrafficTool(ToolBase):
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "city": {
-                    "type": "string",
-                    "description": "城市名称，如：上海、北京、广州等。系统会自动为该城市生成合适的查询范围"
-                },
-                "rectangle": {
-                    "type": "string",
-                    "description": "可选：自定义矩形区域范围，格式为'左下角经度,左下角纬度;右上角经度,右上角纬度'。如不提供，将使用城市默认范围"
-                },
-                "level": {
-                    "type": "integer",
-                    "description": "道路等级过滤，1=主要道路，6=所有道路，默认为1",
-                    "default": 1,
-                    "minimum": 0,
-                    "maximum": 6
-                },
-                "extensions": {
-                    "type": "string",
-                    "description": "返回结果控制，base=基本信息，all=全部信息，默认为base",
-                    "default": "base",
-                    "enum": ["base", "all"]
-                }
-            },
-            "required": ["city"]
-        }
+        return self._PARAMETERS
     
     def execute(self, city: str, rectangle: str = None, level: int = 1, extensions: str = "base") -> str:
         """执行交通态势查询"""
         try:
             # 验证API密钥
-            if not AMAP_API_KEY:
-                return json.dumps({"error": "未配置高德地图API密钥，请在.env文件中设置AMAP_API_KEY"}, ensure_ascii=False)
+            if not self._api_key:
+                return dump_result({"error": "未配置高德地图API密钥，请在.env文件中设置AMAP_API_KEY"})
             
             # 验证城市支持
             if not self._is_city_supported(city):
-                return json.dumps({
+                return dump_result({
                     "error": f"城市'{city}'不支持交通态势查询",
                     "supported_cities": self.SUPPORTED_CITIES
-                }, ensure_ascii=False)
+                })
             
             # 如果没有提供rectangle，根据城市生成默认范围
             if not rectangle:
                 rectangle = self._get_city_default_rectangle(city)
                 if not rectangle:
-                    return json.dumps({"error": f"无法为城市'{city}'生成默认查询范围"}, ensure_ascii=False)
+                    return dump_result({"error": f"无法为城市'{city}'生成默认查询范围"})
             
             # 验证并调整矩形区域
             adjusted_rectangle = self._adjust_rectangle_if_needed(rectangle)
             if not adjusted_rectangle:
-                return json.dumps({"error": "矩形区域格式错误或范围过大，应为'左下角经度,左下角纬度;右上角经度,右上角纬度'，且对角线距离不超过10公里"}, ensure_ascii=False)
+                return dump_result({"error": "矩形区域格式错误或范围过大，应为'左下角经度,左下角纬度;右上角经度,右上角纬度'，且对角线距离不超过10公里"})
             
             # 验证参数范围
             if level < 0 or level > 6:
-                return json.dumps({"error": "道路等级参数错误，应为0-6之间的整数"}, ensure_ascii=False)
+                return dump_result({"error": "道路等级参数错误，应为0-6之间的整数"})
             
             if extensions not in ["base", "all"]:
-                return json.dumps({"error": "extensions参数错误，应为'base'或'all'"}, ensure_ascii=False)
+                return dump_result({"error": "extensions参数错误，应为'base'或'all'"})
             
             # 获取交通态势数据
             traffic_data = self._get_traffic_data(adjusted_rectangle, level, extensions)
             if traffic_data.get("error"):
-                return json.dumps(traffic_data, ensure_ascii=False)
+                return dump_result(traffic_data)
             
             # 格式化返回结果
             formatted_result = self._format_traffic_result(traffic_data, city, adjusted_rectangle)
-            return json.dumps(formatted_result, ensure_ascii=False)
+            return dump_result(formatted_result)
             
         except Exception as e:
-            logger.error(f"交通态势查询出错: {str(e)}")
-            return json.dumps({"error": f"交通态势查询失败: {str(e)}"}, ensure_ascii=False)
+            logger.error("交通态势查询出错: {}", e)
+            return dump_result({"error": f"交通态势查询失败: {str(e)}"})
     
     def _is_city_supported(self, city: str) -> bool:
         """检查城市是否支持交通态势查询"""
-        return any(supported_city in city for supported_city in self.SUPPORTED_CITIES)
+        return self._SUPPORTED_CITY_MATCHER.contains(city)
     
     def _get_city_default_rectangle(self, city: str) -> str:
-        """根据城市获取默认查询矩形范围"""
-        city_rectangles = {
-            "上海": "121.3574,31.1718;121.5810,31.3076",  # 上海市中心区域，约5公里范围
-            "北京": "116.2844,39.8493;116.4733,39.9850",  # 北京市中心区域
-            "广州": "113.1943,23.0669;113.3840,23.1966",  # 广州市中心区域
-            "深圳": "114.0579,22.5178;114.2577,22.6475",  # 深圳市中心区域
-            "杭州": "120.0791,30.2084;120.2688,30.3381",  # 杭州市中心区域
-            "南京": "118.7073,32.0162;118.8970,32.1459",  # 南京市中心区域
-            "武汉": "114.2049,30.5370;114.3946,30.6667",  # 武汉市中心区域
-            "西安": "108.8400,34.2000;109.0400,34.3300",  # 西安市中心区域
-            "成都": "104.0100,30.6000;104.2100,30.7300",  # 成都市中心区域
-            "重庆": "106.4500,29.5000;106.6500,29.6300",  # 重庆市中心区域
-            "天津": "117.1000,39.0000;117.3000,39.1300",  # 天津市中心区域
-            "苏州": "120.5000,31.2000;120.7000,31.3300",  # 苏州市中心区域
-        }
-        
-        for city_name, rectangle in city_rectangles.items():
-            if city_name in city:
-                return rectangle
-        
-        # 如果没有预设的城市范围，返回None
-        return None
+        """根据城市获取默认查询矩形范围，没有预设范围时返回 None"""
+        return self._CITY_RECTANGLE_MATCHER.find_first(city)
     
     def _adjust_rectangle_if_needed(self, rectangle: str) -> str:
         """调整矩形范围以确保符合API要求"""
@@ -159,13 +173,13 @@ class TrafficTool(ToolBase):
                 offset = 0.025
                 
                 new_rectangle = f"{center_lng-offset},{center_lat-offset};{center_lng+offset},{center_lat+offset}"
-                logger.info(f"矩形范围过大，已自动调整为: {new_rectangle}")
+                logger.info("矩形范围过大，已自动调整为: {}", new_rectangle)
                 return new_rectangle
             
             return rectangle
             
         except Exception as e:
-            logger.error(f"调整矩形范围时出错: {str(e)}")
+            logger.error("调整矩形范围时出错: {}", e)
             return None
     
     def _validate_rectangle(self, rectangle: str) -> bool:
@@ -206,16 +220,16 @@ class TrafficTool(ToolBase):
         try:
             # 构建请求参数
             params = {
-                "key": AMAP_API_KEY,
+                "key": self._api_key,
                 "rectangle": rectangle,
                 "level": level,
                 "extensions": extensions,
                 "output": "json"
             }
             
-            logger.info(f"交通态势查询参数: {params}")
+            logger.debug("交通态势查询参数: {}", params)
             
-            response = requests.get(
+            response = get_session().get(
                 "https://restapi.amap.com/v3/traffic/status/rectangle",
                 params=params,
                 timeout=10
@@ -279,14 +293,13 @@ class TrafficTool(ToolBase):
             
             for road in roads:
                 # 获取道路基本信息
+                # 结果会作为 tool 消息发给 LLM，不包含坐标串（polyline）、
+                # 路况编码（lcodes）等模型用不到且占用大量 token 的字段
                 road_info = {
                     "name": road.get("name", "未知道路"),
                     "status": self._get_status_text(road.get("status", "0")),
                     "speed": road.get("speed", "未知"),
                     "direction": road.get("direction", "未知"),
-                    "angle": road.get("angle", "未知"),
-                    "polyline": road.get("polyline", ""),
-                    "lcodes": road.get("lcodes", ""),  # 路况编码
                     "time": road.get("time", "")  # 路况时间
                 }
                 
@@ -299,7 +312,7 @@ class TrafficTool(ToolBase):
                 
                 # 检查是否是高速公路
                 road_name = road_info["name"]
-                if any(keyword in road_name for keyword in ["高速", "快速路", "环线", "立交"]):
+                if self._HIGHWAY_MATCHER.contains(road_name):
                     highway_roads.append(road_info)
                 
                 formatted_roads.append(road_info)
@@ -336,7 +349,7 @@ class TrafficTool(ToolBase):
             }
             
         except Exception as e:
-            logger.error(f"格式化交通数据时出错: {str(e)}")
+            logger.error("格式化交通数据时出错: {}", e)
             return {"error": f"数据格式化失败: {str(e)}"}
     
     def _get_status_text(self, status: str) -> str:
@@ -1,19 +1,68 @@
 from typing import Dict, Any, Optional, Union, List
 import os
-import json
-import requests
+import sys
 from datetime import datetime, timedelta
 from loguru import logger
 from dotenv import load_dotenv
-from .tool_base import ToolBase
+from .tool_base import ToolBase, dump_result, get_session
+from ....utils.ttl_cache import TTLCache
+from ....utils.http_client import get_http_client
 
 # 加载环境变量
 load_dotenv()
 AMAP_API_KEY = os.getenv("AMAP_API_KEY")
 
+GEOCODE_URL = "https://restapi.amap.com/v3/geocode/geo"
+WEATHER_URL = "https://restapi.amap.com/v3/weather/weatherInfo"
+
+# 行政区划编码基本不变，长期缓存；实况天气约每小时更新一次，缓存 5 分钟；
+# 预报数据每天更新数次，缓存 1 小时。键中的 extensions 区分实况与预报
+_adcode_cache = TTLCache(maxsize=1024, ttl=86400)
+_weather_cache = {
+    "base": TTLCache(maxsize=2048, ttl=300),
+    "all": TTLCache(maxsize=2048, ttl=3600),
+}
+
+
+def _location_key(location: str) -> str:
+    """地点名称归一化后作为缓存键，驻留后同一城市的键在各缓存间共享"""
+    return sys.intern(location.strip().lower())
+
 class WeatherTool(ToolBase):
     """天气查询工具"""
     
+    # 参数定义是静态数据，类加载时构建一次
+    _PARAMETERS = {
+        "type": "object",
+        "properties": {
+            "location": {
+                "type": "string",
+                "description": "城市名称，如：北京、上海、广州等"
+            },
+            "forecast_days": {
+                "type": "integer",
+                "description": "预报天数，0表示当前天气，1-7表示未来1-7天的天气预报",
+                "minimum": 0,
+                "maximum": 7,
+                "default": 0
+            },
+            "unit": {
+                "type": "string",
+                "description": "温度单位，celsius（摄氏度）或fahrenheit（华氏度）",
+                "enum": ("celsius", "fahrenheit"),
+                "default": "celsius"
+            }
+        },
+        "required": ("location",)
+    }
+    
+    def __init__(self, api_key: Optional[str] = None):
+        """
+        Args:
+            api_key: 高德地图 API Key，默认使用环境变量 AMAP_API_KEY
+        """
+        self._api_key = api_key or AMAP_API_KEY
+    
     @property
     def name(self) -> str:
         return "get_weather"
@@ -24,29 +73,7 @@ class WeatherTool(ToolBase):
     
     @property
     def parameters(self) -> Dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "location": {
-                    "type": "string",
-                    "description": "城市名称，如：北京、上海、广州等"
-                },
-                "forecast_days": {
-                    "type": "integer",
-                    "description": "预报天数，0表示当前天气，1-7表示未来1-7天的天气预报",
-                    "minimum": 0,
-                    "maximum": 7,
-                    "default": 0
-                },
-                "unit": {
-                    "type": "string",
-                    "description": "温度单位，celsius（摄氏度）或fahrenheit（华氏度）",
-                    "enum": ["celsius", "fahrenheit"],
-                    "default": "celsius"
-                }
-            },
-            "required": ["location"]
-        }
+        return self._PARAMETERS
     
     def execute(self, location: str, forecast_days: int = 0, unit: str = "celsius") -> str:
         """执行天气查询"""
@@ -54,27 +81,83 @@ class WeatherTool(ToolBase):
             # 获取地理编码
             adcode = self._get_location_adcode(location)
             if not adcode:
-                return json.dumps({"error": f"找不到城市: {location}"}, ensure_ascii=False)
+                return dump_result({"error": f"找不到城市: {location}"})
             
             # 根据forecast_days决定查询类型
             if forecast_days == 0:
                 # 查询当前天气
                 weather_data = self._get_current_weather_data(adcode)
-                if weather_data.get("error"):
-                    return json.dumps(weather_data, ensure_ascii=False)
-                formatted_result = self._format_current_weather_result(weather_data, unit)
             else:
                 # 查询未来天气预报
                 weather_data = self._get_forecast_weather_data(adcode, forecast_days)
-                if weather_data.get("error"):
-                    return json.dumps(weather_data, ensure_ascii=False)
-                formatted_result = self._format_forecast_weather_result(weather_data, location, forecast_days, unit)
             
-            return json.dumps(formatted_result, ensure_ascii=False)
+            return self._build_result(weather_data, location, forecast_days, unit)
             
         except Exception as e:
-            logger.error(f"天气查询出错: {str(e)}")
-            return json.dumps({"error": f"天气查询失败: {str(e)}"}, ensure_ascii=False)
+            logger.error("天气查询出错: {}", e)
+            return dump_result({"error": f"天气查询失败: {str(e)}"})
+    
+    async def aexecute(self, location: str, forecast_days: int = 0, unit: str = "celsius") -> str:
+        """异步执行天气查询，使用共享的 httpx.AsyncClient，不占用线程池"""
+        try:
+            client = get_http_client()
+            location_key = _location_key(location)
+            adcode = _adcode_cache.get(location_key)
+            if adcode is None:
+                geo_response = await client.get(
+                    GEOCODE_URL, params={"key": self._api_key, "address": location}, timeout=5
+                )
+                adcode = self._parse_adcode(location, geo_response.json())
+                if not adcode:
+                    return dump_result({"error": f"找不到城市: {location}"})
+                _adcode_cache.set(location_key, adcode)
+            
+            extensions = "base" if forecast_days == 0 else "all"
+            cache = _weather_cache[extensions]
+            weather_data = cache.get(adcode)
+            if weather_data is None:
+                weather_response = await client.get(
+                    WEATHER_URL,
+                    params={"key": self._api_key, "city": adcode, "extensions": extensions},
+                    timeout=5 if forecast_days == 0 else 10,
+                )
+                weather_data = self._check_weather_data(weather_response.json(), forecast_days)
+                if not weather_data.get("error"):
+                    cache.set(adcode, weather_data)
+            
+            return self._build_result(weather_data, location, forecast_days, unit)
+            
+        except Exception as e:
+            logger.error("天气查询出错: {}", e)
+            return dump_result({"error": f"天气查询失败: {str(e)}"})
+    
+    def _build_result(self, weather_data: Dict[str, Any], location: str, forecast_days: int, unit: str) -> str:
+        """将天气数据格式化为工具返回的 JSON 字符串"""
+        if weather_data.get("error"):
+            return dump_result(weather_data)
+        if forecast_days == 0:
+            formatted_result = self._format_current_weather_result(weather_data, unit)
+        else:
+            formatted_result = self._format_forecast_weather_result(weather_data, location, forecast_days, unit)
+        return dump_result(formatted_result)
+    
+    @staticmethod
+    def _parse_adcode(location: str, geo_data: Dict[str, Any]) -> Optional[str]:
+        """从地理编码响应中提取行政区划编码"""
+        if geo_data.get("status") != "1" or not geo_data.get("geocodes"):
+            logger.warning("无法找到地点 '{}' 的行政区划编码", location)
+            return None
+        return geo_data["geocodes"][0]["adcode"]
+    
+    @staticmethod
+    def _check_weather_data(weather_data: Dict[str, Any], forecast_days: int) -> Dict[str, Any]:
+        """校验天气接口响应，失败时返回带 error 的字典"""
+        if forecast_days == 0:
+            if weather_data.get("status") != "1" or not weather_data.get("lives"):
+                return {"error": "无法获取天气数据"}
+        elif weather_data.get("status") != "1" or not weather_data.get("forecasts"):
+            return {"error": "无法获取天气预报数据"}
+        return weather_data
     
     def _get_location_adcode(self, location: str) -> Optional[str]:
         """
@@ -86,63 +169,69 @@ class WeatherTool(ToolBase):
         Returns:
             行政区划编码或None（如果查询失败）
         """
+        location_key = _location_key(location)
+        adcode = _adcode_cache.get(location_key)
+        if adcode is not None:
+            return adcode
+        
         try:
-            geo_response = requests.get(
-                "https://restapi.amap.com/v3/geocode/geo",
-                params={"key": AMAP_API_KEY, "address": location},
+            geo_response = get_session().get(
+                GEOCODE_URL,
+                params={"key": self._api_key, "address": location},
                 timeout=5
             )
             
-            geo_data = geo_response.json()
-            
-            if geo_data.get("status") != "1" or not geo_data.get("geocodes"):
-                logger.warning(f"无法找到地点 '{location}' 的行政区划编码")
-                return None
-            
-            return geo_data["geocodes"][0]["adcode"]
+            adcode = self._parse_adcode(location, geo_response.json())
+            if adcode:
+                _adcode_cache.set(location_key, adcode)
+            return adcode
             
         except Exception as e:
-            logger.error(f"获取地点编码时出错: {str(e)}")
+            logger.error("获取地点编码时出错: {}", e)
             return None
     
     def _get_current_weather_data(self, adcode: str) -> Dict[str, Any]:
         """获取当前天气数据"""
+        weather_data = _weather_cache["base"].get(adcode)
+        if weather_data is not None:
+            return weather_data
+        
         try:
-            weather_response = requests.get(
-                "https://restapi.amap.com/v3/weather/weatherInfo",
-                params={"key": AMAP_API_KEY, "city": adcode, "extensions": "base"},
+            weather_response = get_session().get(
+                WEATHER_URL,
+                params={"key": self._api_key, "city": adcode, "extensions": "base"},
                 timeout=5
             )
             
-            weather_data = weather_response.json()
-            
-            if weather_data.get("status") != "1" or not weather_data.get("lives"):
-                return {"error": "无法获取天气数据"}
-            
+            weather_data = self._check_weather_data(weather_response.json(), 0)
+            if not weather_data.get("error"):
+                _weather_cache["base"].set(adcode, weather_data)
             return weather_data
             
         except Exception as e:
-            logger.error(f"天气API请求失败: {str(e)}")
+            logger.error("天气API请求失败: {}", e)
             return {"error": f"天气API请求失败: {str(e)}"}
     
     def _get_forecast_weather_data(self, adcode: str, forecast_days: int) -> Dict[str, Any]:
         """获取未来天气预报数据"""
+        weather_data = _weather_cache["all"].get(adcode)
+        if weather_data is not None:
+            return weather_data
+        
         try:
-            weather_response = requests.get(
-                "https://restapi.amap.com/v3/weather/weatherInfo",
-                params={"key": AMAP_API_KEY, "city": adcode, "extensions": "all"},
+            weather_response = get_session().get(
+                WEATHER_URL,
+                params={"key": self._api_key, "city": adcode, "extensions": "all"},
                 timeout=10
             )
             
-            weather_data = weather_response.json()
-            
-            if weather_data.get("status") != "1" or not weather_data.get("forecasts"):
-                return {"error": "无法获取天气预报数据"}
-            
+            weather_data = self._check_weather_data(weather_response.json(), forecast_days)
+            if not weather_data.get("error"):
+                _weather_cache["all"].set(adcode, weather_data)
             return weather_data
             
         except Exception as e:
-            logger.error(f"天气预报API请求失败: {str(e)}")
+            logger.error("天气预报API请求失败: {}", e)
             return {"error": f"天气预报API请求失败: {str(e)}"}
     
     def _format_current_weather_result(self, weather_data: Dict[str, Any], unit: str = "celsius") -> Dict[str, Any]:
@@ -211,15 +300,20 @@ class WeatherTool(ToolBase):
         }
 
 # 保留原有的独立函数以保持向后兼容性
+# 工具实例无状态，所有独立函数共享同一个实例
+_weather_tool = WeatherTool()
+
 def get_weather(location: str) -> str:
     """获取城市当前天气（摄氏度）- 为 DeepSeek Function Calling 优化"""
-    weather_tool = WeatherTool()
-    return weather_tool.execute(location)
+    return _weather_tool.execute(location)
+
+async def get_weather_async(location: str) -> str:
+    """异步获取城市当前天气（摄氏度），不阻塞事件循环"""
+    return await _weather_tool.aexecute(location)
 
 def get_weather_forecast(location: str, days: int = 7, unit: str = "celsius") -> str:
     """获取城市未来天气预报"""
-    weather_tool = WeatherTool()
-    return weather_tool.execute(location, forecast_days=days, unit=unit)
+    return _weather_tool.execute(location, forecast_days=days, unit=unit)
 
 def get_location_adcode(location: str) -> Optional[str]:
     """
@@ -231,8 +325,7 @@ def get_location_adcode(location: str) -> Optional[str]:
     Returns:
         行政区划编码或None（如果查询失败）
     """
-    weather_tool = WeatherTool()
-    return weather_tool._get_location_adcode(location)
+    return _weather_tool._get_location_adcode(location)
 
 def get_current_temperature(location: str, unit: str = "celsius") -> Dict:
     """
@@ -245,38 +338,36 @@ def get_current_temperature(location: str, unit: str = "celsius") -> Dict:
     Returns:
         包含天气信息的字典
     """
-    weather_tool = WeatherTool()
-    adcode = weather_tool._get_location_adcode(location)
+    adcode = _weather_tool._get_location_adcode(location)
     if not adcode:
         return {"error": f"找不到地点 '{location}' 或无法获取行政区划编码"}
 
+    weather_data = _weather_tool._get_current_weather_data(adcode)
+    if weather_data.get("error"):
+        logger.warning("无法获取 '{}' 的天气数据", location)
+        return weather_data
+
     try:
-        weather_response = requests.get(
-            "https://restapi.amap.com/v3/weather/weatherInfo",
-            params={"key": AMAP_API_KEY, "city": adcode, "extensions": "base"},
-            timeout=5
-        )
-        
-        data = weather_response.json()
-        if data["status"] == "1" and data.get("lives"):
-            live_weather = data["lives"][0]
-            temp_c = float(live_weather.get("temperature"))
-            temperature = temp_c if unit == "celsius" else temp_c * 9 / 5 + 32
-            return {
-                "temperature": round(temperature, 1),
-                "weather": live_weather.get("weather"),
-                "humidity": live_weather.get("humidity"),
-                "wind_direction": live_weather.get("winddirection"),
-                "wind_power": live_weather.get("windpower"),
-                "location": location,
-                "unit": unit,
-                "report_time": live_weather.get("reporttime")
-            }
-        logger.warning(f"无法获取 '{location}' 的天气数据")
-        return {"error": "天气数据不可用"}
+        lives = weather_data.get("lives")
+        if not lives:
+            logger.warning("无法获取 '{}' 的天气数据", location)
+            return {"error": "天气数据不可用"}
+        live_weather = lives[0]
+        temp_c = float(live_weather.get("temperature"))
+        temperature = temp_c if unit == "celsius" else temp_c * 9 / 5 + 32
+        return {
+            "temperature": round(temperature, 1),
+            "weather": live_weather.get("weather"),
+            "humidity": live_weather.get("humidity"),
+            "wind_direction": live_weather.get("winddirection"),
+            "wind_power": live_weather.get("windpower"),
+            "location": location,
+            "unit": unit,
+            "report_time": live_weather.get("reporttime")
+        }
     except Exception as e:
-        logger.error(f"天气API请求失败: {str(e)}")
-        return {"error": "API请求失败"}
+        logger.error("天气数据解析失败: {}", e)
+        return {"error": "天气数据不可用"}
 
 def get_temperature_date(location: str, date: str, unit: str = "celsius") -> Union[Dict, List[Dict]]:
     """
@@ -290,12 +381,10 @@ def get_temperature_date(location: str, date: str, unit: str = "celsius") -> Uni
     Returns:
         包含天气预报的字典或字典列表
     """
-    weather_tool = WeatherTool()
-    adcode = weather_tool._get_location_adcode(location)
+    adcode = _weather_tool._get_location_adcode(location)
     if not adcode:
         return {"error": f"找不到地点 '{location}' 或无法获取行政区划编码"}
 
-    forecast_url = f"https://restapi.amap.com/v3/weather/weatherInfo?key={AMAP_API_KEY}&city={adcode}&extensions=all"
     dates_to_query = []
     today = datetime.now()
 
@@ -314,38 +403,42 @@ def get_temperature_date(location: str, date: str, unit: str = "celsius") -> Uni
         except ValueError:
             return {"error": f"无效的日期格式: {date}，请使用YYYY-MM-DD格式、'明天'或'未来X天'"}
 
+    weather_data = _weather_tool._get_forecast_weather_data(adcode, len(dates_to_query))
+    if weather_data.get("error"):
+        logger.warning("无法获取 '{}' 的预报数据", location)
+        return weather_data
+
     try:
-        response = requests.get(forecast_url, timeout=10)
-        data = response.json()
-        if data["status"] == "1" and data.get("forecasts"):
-            forecasts = data["forecasts"][0].get("casts", [])
-            results = []
-            for qd in dates_to_query:
-                forecast = next((f for f in forecasts if f.get("date") == qd), None)
-                if forecast:
-                    temp_day = float(forecast.get("daytemp"))
-                    temp_night = float(forecast.get("nighttemp"))
-                    if unit == "fahrenheit":
-                        temp_day = temp_day * 9 / 5 + 32
-                        temp_night = temp_night * 9 / 5 + 32
-                    results.append({
-                        "location": location,
-                        "date": qd,
-                        "day_temperature": round(temp_day, 1),
-                        "night_temperature": round(temp_night, 1),
-                        "unit": unit,
-                        "day_weather": forecast.get("dayweather"),
-                        "night_weather": forecast.get("nightweather"),
-                        "day_wind_direction": forecast.get("daywind"),
-                        "day_wind_power": forecast.get("daypower"),
-                        "night_wind_direction": forecast.get("nightwind"),
-                        "night_wind_power": forecast.get("nightpower"),
-                    })
-                else:
-                    results.append({"date": qd, "error": "未找到预报数据"})
-            return results[0] if len(results) == 1 else results
-        logger.warning(f"无法获取 '{location}' 的预报数据")
-        return {"error": "预报数据不可用"}
+        forecast_list = weather_data.get("forecasts")
+        if not forecast_list:
+            logger.warning("无法获取 '{}' 的预报数据", location)
+            return {"error": "预报数据不可用"}
+        forecasts = forecast_list[0].get("casts", [])
+        results = []
+        for qd in dates_to_query:
+            forecast = next((f for f in forecasts if f.get("date") == qd), None)
+            if forecast:
+                temp_day = float(forecast.get("daytemp"))
+                temp_night = float(forecast.get("nighttemp"))
+                if unit == "fahrenheit":
+                    temp_day = temp_day * 9 / 5 + 32
+                    temp_night = temp_night * 9 / 5 + 32
+                results.append({
+                    "location": location,
+                    "date": qd,
+                    "day_temperature": round(temp_day, 1),
+                    "night_temperature": round(temp_night, 1),
+                    "unit": unit,
+                    "day_weather": forecast.get("dayweather"),
+                    "night_weather": forecast.get("nightweather"),
+                    "day_wind_direction": forecast.get("daywind"),
+                    "day_wind_power": forecast.get("daypower"),
+                    "night_wind_direction": forecast.get("nightwind"),
+                    "night_wind_power": forecast.get("nightpower"),
+                })
+            else:
+                results.append({"date": qd, "error": "未找到预报数据"})
+        return results[0] if len(results) == 1 else results
     except Exception as e:
-        logger.error(f"天气API请求失败: {str(e)}")
-        return {"error": "API请求失败"}
\ No newline at end of file
+        logger.error("预报数据解析失败: {}", e)
+        return {"error": "预报数据不可用"}
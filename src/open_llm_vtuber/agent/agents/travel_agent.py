@@ -1,9 +1,10 @@
 import os
 import re
 import json
-import requests
+import httpx
 import asyncio
-import concurrent.futures
+import threading
+from collections import deque
 from typing import AsyncIterator, List, Dict, Any, Callable, Literal
 from loguru import logger
 from dotenv import load_dotenv
@@ -12,19 +13,17 @@ from .agent_interface import AgentInterface
 from ..output_types import SentenceOutput, DisplayText
 from ..input_types import BatchInput, TextSource, ImageSource
 from ...chat_history_manager import get_history
-from ..transformers import (
-    sentence_divider,
-    actions_extractor,
-    tts_filter,
-    display_processor,
-)
+from ..transformers import sentence_pipeline
 from ...config_manager import TTSPreprocessorConfig
 from .tools.tool_base import ToolManager
+from ...utils.ttl_cache import TTLCache
 from .tools.weather_tool import WeatherTool
 from .tools.infrastructure_tool import InfrastructureTool
 from .tools.traffic_tool import TrafficTool
 from .tools.ip_location_tool import IPLocationTool
 from ..stateless_llm.stateless_llm_interface import StatelessLLMInterface
+from ...utils.keyword_matcher import KeywordMatcher
+from ...utils.http_client import get_http_client
 
 # ──────────────────── 1. 读取环境变量 ──────────────────── 
 load_dotenv()
@@ -36,12 +35,393 @@ if not DEEPSEEK_API_KEY:
 if not AMAP_API_KEY:
     logger.warning("ERROR 未检测到 AMAP_API_KEY，请在 .env 文件中配置。")
 
+# 图片来源描述与提示词片段模板，模块加载时构建一次
+_IMAGE_SOURCE_DESC = {
+    ImageSource.CAMERA: "captured from camera",
+    ImageSource.SCREEN: "screenshot",
+    ImageSource.CLIPBOARD: "from clipboard",
+    ImageSource.UPLOAD: "uploaded",
+}
+_CLIPBOARD_FMT = "[Clipboard content: {}]".format
+_IMAGE_LINE_FMT = "- Image {} ({})".format
+
+DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+# 首次请求（允许调用工具）与最终回复请求中不随对话变化的参数
+_FUNCTION_CALL_OPTIONS = {
+    "model": "deepseek-chat",
+    "tool_choice": "auto",  # 让AI自主决定是否调用工具
+    "parallel_tool_calls": True,  # 启用并行工具调用
+    "temperature": 0.3,  # 降低温度提高一致性
+    "max_tokens": 2000,
+}
+_FINAL_RESPONSE_OPTIONS = {
+    "model": "deepseek-chat",
+    "temperature": 0.7,
+    "max_tokens": 2000,
+    "stream": True,  # 最终回复流式返回，首句生成后即可开始 TTS
+}
+# 天气查询快速路径：同时命中天气关键词与城市名的简短问题直接调用天气工具，
+# 省去一次用于判断意图的 DeepSeek 请求
+_WEATHER_KEYWORDS = ("天气", "气温", "温度", "下雨", "下雪", "几度", "weather", "temperature")
+# 涉及预报的问题需要模型决定 forecast_days，不走快速路径
+_FORECAST_KEYWORDS = (
+    "明天", "后天", "大后天", "未来", "下周", "周末", "预报", "这周", "本周",
+    "tomorrow", "forecast", "weekend", "next week",
+)
+_WEATHER_CITIES = (
+    "北京", "上海", "天津", "重庆", "广州", "深圳", "杭州", "南京", "苏州", "成都",
+    "武汉", "西安", "长沙", "郑州", "济南", "青岛", "沈阳", "大连", "哈尔滨", "长春",
+    "石家庄", "太原", "呼和浩特", "合肥", "福州", "厦门", "南昌", "南宁", "海口", "三亚",
+    "贵阳", "昆明", "拉萨", "兰州", "西宁", "银川", "乌鲁木齐", "宁波", "温州", "无锡",
+    "佛山", "东莞", "珠海", "桂林", "丽江", "大理", "香港", "澳门", "台北",
+)
+_KIND_WEATHER = "weather"
+_KIND_FORECAST = "forecast"
+_KIND_CITY = "city"
+# 三类关键词合并为一个匹配器，一次扫描同时得到意图词与城市名
+_WEATHER_QUERY_MATCHER = KeywordMatcher(
+    {
+        **{word: (_KIND_WEATHER, word) for word in _WEATHER_KEYWORDS},
+        **{word: (_KIND_FORECAST, word) for word in _FORECAST_KEYWORDS},
+        **{city: (_KIND_CITY, city) for city in _WEATHER_CITIES},
+    }
+)
+# 只问当前温度的快速路径问题直接用模板回答，省去生成最终回复的 DeepSeek 请求；
+# 去掉城市名后整句必须只剩温度询问，如“现在几度”“的气温是多少”，
+# 带有其他诉求的问题（如“气温适合跑步吗”）仍交给模型回答
+_PURE_TEMPERATURE_PATTERN = re.compile(
+    r'(?:现在|当前|目前|今天)?的?'
+    r'(?:(?:气温|温度|temperature)(?:是|有)?(?:几度|多少度|多少)?|几度|多少度)'
+    r'[吗呢啊呀？?！!。.\s]*',
+    re.IGNORECASE,
+)
+# 没有具体方向的风向描述，回答中不再追加“风”字
+_DIRECTIONLESS_WINDS = frozenset({"无风向", "旋转不定", "未知"})
+# 快速路径只处理简短的单一意图问题
+_FAST_PATH_MAX_QUERY_LEN = 40
+_LOCAL_WEATHER_CALL_ID = "call_local_weather"
+# 快速路径回答缓存：相同的温度询问在有效期内直接复用上次的模板回答；
+# 只缓存模板回答，它只由天气数据生成，与角色设定和对话记忆无关，可以在会话间共享
+_WEATHER_ANSWER_TTL = 600
+_WEATHER_ANSWER_CACHE_SIZE = 512
+_weather_answer_cache = TTLCache(maxsize=_WEATHER_ANSWER_CACHE_SIZE, ttl=_WEATHER_ANSWER_TTL)
+# 单个工具调用的超时时间（秒）
+_TOOL_TIMEOUT = 30
+# 记忆的 token 预算（粗略估算），超出后从最早的对话开始淘汰
+_MAX_MEMORY_TOKENS = 4096
+# 淘汰时至少保留的消息条数
+_MIN_MEMORY_MESSAGES = 4
+# 记忆最多保留的消息条数，与 token 预算同时生效
+_MAX_MEMORY_MESSAGES = 64
+
+
+def _local_weather_call(query: str) -> Dict[str, Any] | None:
+    """
+    识别简单的当前天气问题（如“北京天气怎么样”）
+
+    Returns:
+        命中时返回一条等价于模型输出的 assistant 工具调用消息，否则返回 None
+    """
+    if len(query) > _FAST_PATH_MAX_QUERY_LEN:
+        return None
+    has_weather_keyword = False
+    cities: Dict[str, None] = {}
+    for _, (kind, word) in _WEATHER_QUERY_MATCHER.iter_matches(query):
+        if kind == _KIND_FORECAST:
+            return None
+        if kind == _KIND_CITY:
+            cities[word] = None
+        else:
+            has_weather_keyword = True
+    if not has_weather_keyword or len(cities) != 1:
+        return None
+    city = next(iter(cities))
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [
+            {
+                "id": _LOCAL_WEATHER_CALL_ID,
+                "type": "function",
+                "function": {
+                    "name": "get_weather",
+                    "arguments": json.dumps({"location": city}, ensure_ascii=False),
+                },
+            }
+        ],
+    }
+
+
+def _is_pure_temperature_query(query: str) -> bool:
+    """判断问题去掉城市名后是否只是在询问当前温度"""
+    rest = query
+    # 从后往前删除城市名，前面匹配的下标不受影响
+    matches = list(_WEATHER_QUERY_MATCHER.iter_matches(query))
+    for start, (kind, word) in reversed(matches):
+        if kind == _KIND_CITY:
+            rest = rest[:start] + rest[start + len(word):]
+    return _PURE_TEMPERATURE_PATTERN.fullmatch(rest.strip()) is not None
+
+
+def _template_weather_answer(query: str, tool_result: Dict[str, Any]) -> str | None:
+    """
+    为只询问当前温度的问题直接生成回答
+
+    Returns:
+        问题不是单纯的温度询问或工具结果不可用时返回 None
+    """
+    if not tool_result["success"] or not _is_pure_temperature_query(query):
+        return None
+    try:
+        weather = json.loads(tool_result["content"])
+    except ValueError:
+        return None
+    if weather.get("type") != "current_weather":
+        return None
+    wind_direction = weather['winddirection']
+    if wind_direction in _DIRECTIONLESS_WINDS:
+        wind = f"风力{weather['windpower']}"
+    else:
+        wind = f"{wind_direction}风{weather['windpower']}"
+    return (
+        f"{weather['city']}现在{weather['weather']}，气温{weather['temperature']}，"
+        f"湿度{weather['humidity']}，{wind}。"
+    )
+
+
+def _is_error_result(content: str) -> bool:
+    """判断工具返回的内容是否为错误结果（工具内部捕获异常后返回 {"error": ...}）"""
+    try:
+        result = json.loads(content)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(result, dict) and "error" in result
+
+
+# 最终回复中异常的工具调用标记
+_TOOL_MARKER_PATTERN = re.compile(
+    r'function\w+'  # functionget_weather 等
+    r'|tool_call\w+'  # tool_call 相关
+    r'|\{"tool_calls"',  # JSON 工具调用残留
+    re.IGNORECASE,
+)
+# markdown 格式清理规则，按顺序逐行应用
+_MARKDOWN_PATTERNS = tuple(
+    (re.compile(pattern), replacement)
+    for pattern, replacement in (
+        # 标题格式 (# ## ### 等)
+        (r'^#{1,6}\s+(.+)$', r'\1'),
+        # 粗体格式 (**text** 或 __text__)
+        (r'\*\*(.+?)\*\*', r'\1'),
+        (r'__(.+?)__', r'\1'),
+        # 斜体格式 (*text* 或 _text_)
+        (r'(?<!\*)\*([^*]+?)\*(?!\*)', r'\1'),
+        (r'(?<!_)_([^_]+?)_(?!_)', r'\1'),
+        # 代码块格式 (```code``` 或 `code`)
+        (r'```[\s\S]*?```', ''),
+        (r'`([^`]+?)`', r'\1'),
+        # 链接格式 [text](url)
+        (r'\[([^\]]+?)\]\([^\)]+?\)', r'\1'),
+        # 图片格式 ![alt](url)
+        (r'!\[[^\]]*?\]\([^\)]+?\)', ''),
+        # 列表格式 (- 或 * 或 数字.)
+        (r'^\s*[-*+]\s+', ''),
+        (r'^\s*\d+\.\s+', ''),
+        # 引用格式 (> text)
+        (r'^\s*>\s+(.+)$', r'\1'),
+        # 水平分割线
+        (r'^\s*[-*_]{3,}\s*$', ''),
+        # 表格分隔符
+        (r'\|', ' '),
+        # HTML标签
+        (r'<[^>]+>', ''),
+    )
+)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def _clean_response_line(line: str) -> str:
+    """
+    清理最终回复中的一行：移除异常的工具调用标记和 markdown 格式
+
+    所有规则都只作用于单行，因此可以在流式输出时逐行清理。
+    """
+    if _TOOL_MARKER_PATTERN.search(line):
+        logger.debug("检测到异常工具调用标记: {}", line)
+        line = _TOOL_MARKER_PATTERN.sub('', line)
+    for pattern, replacement in _MARKDOWN_PATTERNS:
+        line = pattern.sub(replacement, line)
+    # 清理多余空格但保留基本格式
+    return _WHITESPACE_PATTERN.sub(' ', line).strip()
+
+
+# 流式输出时在这些句末标点处提前输出，不必等到整行结束
+_SENTENCE_END_PATTERN = re.compile(r'[。！？!?；…]+')
+
+
+def _has_open_markup(text: str) -> bool:
+    """判断文本中是否有尚未闭合的 markdown/HTML 标记，此时不能截断清理"""
+    return bool(
+        text.count('`') % 2
+        or text.count('**') % 2
+        or text.count('__') % 2
+        or text.replace('**', '').count('*') % 2
+        or text.count('[') > text.count(']')
+        or text.rfind('](') > text.rfind(')')
+        or text.rfind('<') > text.rfind('>')
+    )
+
+
+def _sentence_flush_point(text: str) -> int:
+    """
+    返回可以提前输出的前缀长度：最后一个句末标点之后，且之前的标记均已闭合
+
+    没有可输出的前缀时返回 0。
+    """
+    end = 0
+    for match in _SENTENCE_END_PATTERN.finditer(text):
+        if not _has_open_markup(text[:match.end()]):
+            end = match.end()
+    return end
+
+
+def _format_segment(segment: str, line_start: bool, emitted: bool) -> str:
+    """
+    清理一段输出文本，并补上与已输出内容之间的分隔
+
+    新一行的内容前补换行；行内后续片段保留原有的前导空格。
+    """
+    cleaned = _clean_response_line(segment)
+    if not cleaned:
+        return ""
+    if line_start:
+        return "\n" + cleaned if emitted else cleaned
+    return " " + cleaned if segment[:1].isspace() else cleaned
+
+
+class _FunctionCallUnavailable(Exception):
+    """Function Calling 无法完成，调用方应回退到普通聊天"""
+
+
+def _estimate_tokens(content: Any) -> int:
+    """粗略估算消息内容的 token 数，避免在每轮对话中运行分词器"""
+    return len(content) // 2 if isinstance(content, str) else 0
+
+# DeepSeek 请求的超时时间（秒），请求通过服务共享的 HTTP 客户端发送
+_DEEPSEEK_TIMEOUT = 60
+
+
+class _RequestCoalescer:
+    """
+    合并并发的相同 DeepSeek 请求
+
+    同一时刻 payload 完全一致的请求（例如多个新会话问了同一个问题）只发送一次，
+    响应分发给所有等待者。DeepSeek 没有批量接口，不同的请求本身已在共享的
+    AsyncClient 上并行发送，因此这里只折叠重复请求，不引入额外的等待窗口。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def post(
+        self, headers: Dict[str, str], payload: Dict[str, Any], tools_json: str | None = None
+    ) -> httpx.Response:
+        """
+        发送请求，若已有相同请求在进行中则等待其结果
+
+        Args:
+            tools_json: 预先序列化好的 tools 定义，直接拼接进请求体，避免每次重新序列化
+        """
+        body = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        if tools_json is not None:
+            body = f'{body[:-1]},"tools":{tools_json}}}'
+        # 发起请求的协程被取消时，重新查找：可能已有其他等待者接手重发
+        while (future := self._inflight.get(body)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[body] = future
+        try:
+            response = await get_http_client().post(
+                DEEPSEEK_API_URL,
+                headers=headers,
+                content=body.encode("utf-8"),
+                timeout=_DEEPSEEK_TIMEOUT,
+            )
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # 标记异常已读取，避免无等待者时的告警
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            # 只移除自己登记的 future，避免误删接手者的请求
+            if self._inflight.get(body) is future:
+                del self._inflight[body]
+
+
+_coalescer = _RequestCoalescer()
+
+# 所有 TravelAgent 实例共享的工具管理器，首次创建 Agent 时构建
+_tool_manager: ToolManager | None = None
+_tool_manager_lock = threading.Lock()
+
+
+def _get_tool_manager() -> ToolManager:
+    """获取共享的工具管理器，首次调用时注册所有工具"""
+    global _tool_manager
+    if _tool_manager is None:
+        with _tool_manager_lock:
+            if _tool_manager is None:
+                logger.debug("开始注册工具...")
+                tool_manager = ToolManager()
+                
+                # 注册天气工具
+                tool_manager.register_tool(WeatherTool(AMAP_API_KEY))
+                
+                # 注册基础设施查询工具
+                tool_manager.register_tool(InfrastructureTool(AMAP_API_KEY))
+                
+                # 注册交通态势查询工具
+                tool_manager.register_tool(TrafficTool(AMAP_API_KEY))
+                
+                # 注册 ip 定位查询工具
+                tool_manager.register_tool(IPLocationTool(AMAP_API_KEY))
+                
+                logger.debug("工具注册完成，共注册 {} 个工具", len(tool_manager.get_all_tools()))
+                _tool_manager = tool_manager
+    return _tool_manager
+
 
 class TravelAgent(AgentInterface):
     """
     旅行助手 Agent，支持 DeepSeek Function Calling
     """
 
+    __slots__ = (
+        "_memory",
+        "_memory_tokens",
+        "_llm",
+        "_system",
+        "_system_message",
+        "_live2d_model",
+        "_tts_preprocessor_config",
+        "_faster_first_response",
+        "_segment_method",
+        "interrupt_method",
+        "_interrupt_handled",
+        "_tool_manager",
+        "_chat_function",
+    )
+
     def __init__(
         self,
         llm: StatelessLLMInterface,
@@ -65,9 +445,12 @@ class TravelAgent(AgentInterface):
             interrupt_method: 中断处理方法
         """
         super().__init__()
-        self._memory = []
+        # 记忆只保存对话消息，系统提示单独固定在每次请求的开头
+        self._memory: deque[Dict[str, Any]] = deque()
+        self._memory_tokens = 0
         self._llm = llm
         self._system = system_prompt
+        self._system_message = {"role": "system", "content": system_prompt}
         self._live2d_model = live2d_model
         self._tts_preprocessor_config = tts_preprocessor_config
         self._faster_first_response = faster_first_response
@@ -75,32 +458,13 @@ class TravelAgent(AgentInterface):
         self.interrupt_method = interrupt_method
         self._interrupt_handled = False
         
-        # 初始化工具管理器
-        self._tool_manager = ToolManager()
-        self._register_tools()
+        # 工具无会话状态，所有实例共享同一个工具管理器
+        self._tool_manager = _get_tool_manager()
         
         # 设置聊天功能
-        self.chat = self._chat_function_factory(llm.chat_completion)
+        self._chat_function = self._chat_function_factory(llm.chat_completion)
         logger.info("TravelAgent initialized.")
     
-    def _register_tools(self):
-        """注册所有工具"""
-        print("🔧 [DEBUG] 开始注册工具...")
-        
-        # 注册天气工具
-        self._tool_manager.register_tool(WeatherTool())
-
-        # 注册基础设施查询工具
-        self._tool_manager.register_tool(InfrastructureTool())
-
-        # 注册交通态势查询工具
-        self._tool_manager.register_tool(TrafficTool())
-
-        # 注册 ip 定位查询工具
-        self._tool_manager.register_tool(IPLocationTool())
-        
-        print(f"🔧 [DEBUG] 工具注册完成，共注册 {len(self._tool_manager.get_all_tools())} 个工具")
-    
     def _set_llm(self, llm: StatelessLLMInterface):
         """
         设置要使用的 LLM
@@ -109,7 +473,7 @@ class TravelAgent(AgentInterface):
             llm: StatelessLLMInterface - LLM 实例
         """
         self._llm = llm
-        self.chat = self._chat_function_factory(llm.chat_completion)
+        self._chat_function = self._chat_function_factory(llm.chat_completion)
 
     def _add_message(
         self,
@@ -138,21 +502,37 @@ class TravelAgent(AgentInterface):
                 message_data["avatar"] = display_text.avatar
 
         self._memory.append(message_data)
+        self._memory_tokens += _estimate_tokens(text_content)
+        self._trim_memory()
+
+    def _trim_memory(self) -> None:
+        """按 token 预算与条数上限淘汰最早的对话"""
+        memory = self._memory
+        while (
+            self._memory_tokens > _MAX_MEMORY_TOKENS or len(memory) > _MAX_MEMORY_MESSAGES
+        ) and len(memory) > _MIN_MEMORY_MESSAGES:
+            evicted = memory.popleft()
+            self._memory_tokens -= _estimate_tokens(evicted["content"])
+
+    def _recount_memory_tokens(self) -> None:
+        """在记忆被直接修改后重新估算 token 数并按预算淘汰"""
+        self._memory_tokens = sum(_estimate_tokens(m["content"]) for m in self._memory)
+        self._trim_memory()
 
     def set_memory_from_history(self, conf_uid: str, history_uid: str) -> None:
         """从聊天历史加载记忆"""
         messages = get_history(conf_uid, history_uid)
 
-        self._memory.append({
-            "role": "system",
-            "content": self._system,
-        })
-
-        for msg in messages:
-            self._memory.append({
+        # 系统提示固定在请求开头，不再写入记忆
+        self._memory.extend(
+            {
                 "role": "user" if msg["role"] == "human" else "assistant",
                 "content": msg["content"],
-            })
+            }
+            for msg in messages
+        )
+
+        self._recount_memory_tokens()
 
     def handle_interrupt(self, heard_response: str) -> None:
         """处理用户中断"""
@@ -174,359 +554,288 @@ class TravelAgent(AgentInterface):
                 "content": "[Interrupted by user]",
             })
 
+        self._recount_memory_tokens()
+
     def reset_interrupt(self) -> None:
         """重置中断标志"""
         self._interrupt_handled = False
 
     def _to_text_prompt(self, input_data: BatchInput) -> str:
         """将 BatchInput 格式化为提示字符串"""
+        texts = input_data.texts
+        # 最常见的情况：只有一段用户输入且没有图片，直接返回原文
+        if len(texts) == 1 and not input_data.images and texts[0].source == TextSource.INPUT:
+            return texts[0].content
+        
         message_parts = []
 
-        for text_data in input_data.texts:
+        for text_data in texts:
             if text_data.source == TextSource.INPUT:
                 message_parts.append(text_data.content)
             elif text_data.source == TextSource.CLIPBOARD:
-                message_parts.append(f"[Clipboard content: {text_data.content}]")
+                message_parts.append(_CLIPBOARD_FMT(text_data.content))
 
         if input_data.images:
             message_parts.append("\nImages in this message:")
-            for i, img_data in enumerate(input_data.images, 1):
-                source_desc = {
-                    ImageSource.CAMERA: "captured from camera",
-                    ImageSource.SCREEN: "screenshot",
-                    ImageSource.CLIPBOARD: "from clipboard",
-                    ImageSource.UPLOAD: "uploaded",
-                }[img_data.source]
-                message_parts.append(f"- Image {i} ({source_desc})")
+            message_parts.extend(
+                _IMAGE_LINE_FMT(i, _IMAGE_SOURCE_DESC[img_data.source])
+                for i, img_data in enumerate(input_data.images, 1)
+            )
 
         return "\n".join(message_parts)
 
-    def _deepseek_function_call(self, query: str) -> str:
-        """使用 DeepSeek API 进行函数调用，支持多个 tool 并发调用"""
-        print("\n🔧 [DEBUG] 开始尝试 DeepSeek Function Calling...")
-        print(f"🔧 [DEBUG] 用户输入: {query}")
+    async def _deepseek_function_call(self, query: str) -> AsyncIterator[str]:
+        """
+        使用 DeepSeek API 进行函数调用，支持多个 tool 并发调用
+
+        最终回复以流的形式逐行产出。在产出任何内容之前失败时抛出
+        _FunctionCallUnavailable，调用方应回退到普通聊天。
+        """
+        logger.debug("开始尝试 DeepSeek Function Calling...")
+        logger.debug("用户输入: {}", query)
         
         if not DEEPSEEK_API_KEY:
-            print("ERROR [DEBUG] DeepSeek API Key 未配置")
-            return "ERROR DeepSeek API Key 未配置，无法使用智能功能。"
+            logger.error("DeepSeek API Key 未配置")
+            raise _FunctionCallUnavailable("DeepSeek API Key 未配置，无法使用智能功能。")
             
         headers = {
             "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
             "Content-Type": "application/json"
         }
         
-        # 构建包含记忆的消息列表
-        messages = self._memory.copy() if self._memory else []
+        assistant_message = _local_weather_call(query)
+        cache_key = None
+        if assistant_message is not None:
+            cache_key = query.strip().lower()
+            cached_answer = _weather_answer_cache.get(cache_key)
+            if cached_answer is not None:
+                logger.debug("命中天气回答缓存，跳过 DeepSeek 与天气查询")
+                yield cached_answer
+                return
+            logger.debug("命中天气查询快速路径，跳过首次 DeepSeek 请求")
+        
+        # 缓存未命中才构建本轮的消息列表：系统提示 + 记忆 + 当前用户输入
+        # 该列表随后会追加工具消息并被序列化，因此必须是独立的 list；
+        # 记忆本身有上限，本轮追加的工具消息不会写回记忆
+        messages = [self._system_message, *self._memory, {"role": "user", "content": query}]
         
-        # 如果没有系统消息，添加系统提示
-        if not messages or messages[0]["role"] != "system":
-            messages.insert(0, {
-                "role": "system",
-                "content": self._system
+        logger.debug("构建的消息数量: {}", len(messages))
+        
+        if assistant_message is None:
+            # 获取所有工具的函数定义（已序列化）
+            tools_json = self._tool_manager.get_function_definitions_json()
+            
+            # 优化API参数以提升AI的工具调用能力
+            payload = {**_FUNCTION_CALL_OPTIONS, "messages": messages}
+            
+            logger.debug("正在调用 DeepSeek API...")
+            response = await _coalescer.post(headers, payload, tools_json)
+            
+            if response.status_code != 200:
+                logger.error("API 调用失败: {} - {}", response.status_code, response.text)
+                raise _FunctionCallUnavailable(f"API 调用失败: {response.status_code}")
+            
+            assistant_message = response.json()["choices"][0]["message"]
+            logger.debug("DeepSeek API 响应状态: 成功")
+        
+        # 检查是否要求调用函数
+        tool_calls = assistant_message.get("tool_calls")
+        if not tool_calls:
+            # AI 判断不需要调用工具，返回普通回复
+            logger.debug("AI 自主判断不需要调用工具，返回普通回复")
+            content = assistant_message.get("content")
+            if not content:
+                raise _FunctionCallUnavailable("DeepSeek 返回了空回复")
+            yield content
+            return
+        
+        logger.debug("AI 自主决定调用工具，工具数量: {}", len(tool_calls))
+        
+        # 记录AI的工具选择决策
+        for i, tool_call in enumerate(tool_calls, 1):
+            function = tool_call["function"]
+            logger.debug("工具 {}: {} - 参数: {}", i, function["name"], function["arguments"])
+        
+        # 步骤2: 并发执行多个函数调用
+        # 添加助手的消息（包含工具调用请求）
+        messages.append(assistant_message)
+        
+        # 并发执行所有工具调用
+        tool_results = await self._execute_tools_concurrently(tool_calls)
+        
+        # 将所有工具结果添加到消息列表
+        for tool_call, result in zip(tool_calls, tool_results):
+            messages.append({
+                "role": "tool",
+                "content": result["content"],
+                "tool_call_id": tool_call["id"]
             })
         
-        # 添加当前用户输入
-        messages.append({"role": "user", "content": query})
+        logger.debug("所有函数调用完成，共执行 {} 个函数", len(tool_calls))
         
-        print(f"🔧 [DEBUG] 构建的消息数量: {len(messages)}")
+        if cache_key is not None:
+            # 快速路径只有一个天气调用，单纯的温度询问不需要模型组织语言；
+            # 查询失败时不会生成模板回答，也就不会被缓存
+            answer = _template_weather_answer(query, tool_results[0])
+            if answer is not None:
+                logger.debug("温度询问使用模板回答，跳过最终 DeepSeek 请求")
+                _weather_answer_cache.set(cache_key, answer)
+                yield answer
+                return
         
-        # 获取所有工具的函数定义
-        tools = self._tool_manager.get_function_definitions()
-        print(f"🔧 [DEBUG] 可用工具数量: {len(tools)}")
+        # 步骤3: 将所有函数结果返回给模型，流式获取最终回复
+        logger.debug("将所有函数结果返回给 DeepSeek 模型...")
+        logger.debug("发送的消息数量: {}", len(messages))
         
-        # 优化API参数以提升AI的工具调用能力
-        payload = {
-            "model": "deepseek-chat",
-            "messages": messages,
-            "tools": tools,
-            "tool_choice": "auto",  # 让AI自主决定是否调用工具
-            "parallel_tool_calls": True,  # 启用并行工具调用
-            "temperature": 0.3,  # 降低温度提高一致性
-            "max_tokens": 2000
-        }
+        # 构建最终请求，不包含 tools 参数
+        final_payload = {**_FINAL_RESPONSE_OPTIONS, "messages": messages}
         
-        try:
-            print("🔧 [DEBUG] 正在调用 DeepSeek API...")
-            response = requests.post(
-                "https://api.deepseek.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
+        # 重试机制：只有在尚未输出任何内容时才重试
+        max_retries = 2
+        emitted = False
+        
+        for retry in range(max_retries):
+            try:
+                async for chunk in self._stream_final_response(headers, final_payload):
+                    yield chunk
+                    emitted = True
+            except Exception as e:
+                if emitted or retry == max_retries - 1:
+                    raise
+                logger.error("第 {} 次最终调用异常: {}", retry + 1, e)
+                continue
+            if emitted:
+                break
+            if retry < max_retries - 1:
+                logger.debug("第 {} 次尝试响应异常，重试中...", retry + 1)
+        
+        if not emitted:
+            logger.debug("最终回复为空，返回默认消息")
+            yield "抱歉，我已经获取了相关信息，但生成回复时出现了问题。请稍后重试。"
+            return
+        
+        logger.debug("DeepSeek 多函数调用执行成功！")
+    
+    async def _stream_final_response(
+        self, headers: Dict[str, str], payload: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        流式请求最终回复，逐句产出清理后的非空内容
+
+        DeepSeek 以 SSE 返回增量内容。未输出的文本保存在滚动缓冲区中，
+        遇到换行或句末标点（且之前的 markdown 标记均已闭合）时清理并立即输出，
+        单段长回复也能在第一句生成后就交给 TTS。
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        async with get_http_client().stream(
+            "POST", DEEPSEEK_API_URL, headers=headers, content=body, timeout=_DEEPSEEK_TIMEOUT
+        ) as response:
+            logger.debug("最终响应状态码: {}", response.status_code)
             if response.status_code != 200:
-                print(f"ERROR [DEBUG] API 调用失败: {response.status_code} - {response.text}")
-                return f"ERROR API 调用失败: {response.status_code}"
-            
-            response_json = response.json()
-            print("🔧 [DEBUG] DeepSeek API 响应状态: 成功")
-            
-            # 检查是否要求调用函数
-            tool_calls = response_json["choices"][0]["message"].get("tool_calls")
-            if not tool_calls:
-                # AI 判断不需要调用工具，返回普通回复
-                print("🔧 [DEBUG] AI 自主判断不需要调用工具，返回普通回复")
-                return response_json["choices"][0]["message"]["content"]
-            
-            print(f"🔧 [DEBUG] AI 自主决定调用工具，工具数量: {len(tool_calls)}")
-            
-            # 记录AI的工具选择决策
-            for i, tool_call in enumerate(tool_calls):
-                function_name = tool_call["function"]["name"]
-                function_args = tool_call["function"]["arguments"]
-                print(f"🔧 [DEBUG] 工具 {i+1}: {function_name} - 参数: {function_args}")
-            
-            # 步骤2: 并发执行多个函数调用
-            assistant_message = response_json["choices"][0]["message"]
-            
-            # 添加助手的消息（包含工具调用请求）
-            messages.append(assistant_message)
-            
-            # 并发执行所有工具调用
-            tool_results = self._execute_tools_concurrently(tool_calls)
-            
-            # 将所有工具结果添加到消息列表
-            for tool_call, result in zip(tool_calls, tool_results):
-                messages.append({
-                    "role": "tool",
-                    "content": result["content"],
-                    "tool_call_id": tool_call["id"]
-                })
-            
-            print(f"🔧 [DEBUG] 所有函数调用完成，共执行 {len(tool_calls)} 个函数")
-            
-            # 步骤3: 将所有函数结果返回给模型，获取最终回复
-            print("🔧 [DEBUG] 将所有函数结果返回给 DeepSeek 模型...")
-            print(f"🔧 [DEBUG] 发送的消息数量: {len(messages)}")
-            
-            # 构建最终请求，不包含 tools 参数
-            final_payload = {
-                "model": "deepseek-chat",
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 2000
-            }
-            
-            # 重试机制
-            max_retries = 2
-            final_content = None
-            
-            for retry in range(max_retries):
-                try:
-                    final_response = requests.post(
-                        "https://api.deepseek.com/v1/chat/completions",
-                        headers=headers,
-                        json=final_payload,
-                        timeout=60
-                    )
-                    
-                    print(f"🔧 [DEBUG] 最终响应状态码: {final_response.status_code}")
-                    
-                    if final_response.status_code != 200:
-                        print(f"ERROR [DEBUG] 最终API调用失败: {final_response.text}")
-                        if retry < max_retries - 1:
-                            print(f"[DEBUG] 第 {retry + 1} 次尝试失败，重试中...")
-                            continue
-                        return "ERROR 获取最终回复时出现错误"
-                    
-                    final_response_json = final_response.json()
-                    
-                    final_content = final_response_json["choices"][0]["message"]["content"]
-                    print(f"🔧 [DEBUG] Function Calling 完成，最终回复长度: {len(final_content)}")
-                    
-                    # 响应格式验证和清理
-                    if final_content and self._validate_and_clean_response(final_content):
-                        final_content = self._validate_and_clean_response(final_content)
-                        break
-                    elif retry < max_retries - 1:
-                        print(f"[DEBUG] 第 {retry + 1} 次尝试响应异常，重试中...")
-                        continue
-                        
-                except Exception as e:
-                    print(f"ERROR [DEBUG] 第 {retry + 1} 次最终调用异常: {str(e)}")
-                    if retry < max_retries - 1:
-                        continue
-                    else:
-                        raise e
-            
-            if not final_content:
-                print("[DEBUG] 最终回复为空，返回默认消息")
-                return "抱歉，我已经获取了相关信息，但生成回复时出现了问题。请稍后重试。"
-            
-            print("✅ [DEBUG] DeepSeek 多函数调用执行成功！")
-            return final_content
-            
-        except Exception as e:
-            print(f"ERROR [DEBUG] DeepSeek API 调用失败: {str(e)}")
-            logger.error(f"DeepSeek API 调用失败: {str(e)}")
-            return f"ERROR 抱歉，智能功能暂时不可用: {str(e)}"
+                await response.aread()
+                logger.error("最终API调用失败: {}", response.text)
+                raise _FunctionCallUnavailable(f"最终API调用失败: {response.status_code}")
+            
+            # buffer: 当前行尚未输出的文本；line_start: buffer 是否从行首开始
+            buffer = ""
+            line_start = True
+            emitted = False
+            async for event in response.aiter_lines():
+                if not event.startswith("data:"):
+                    continue
+                data = event[5:].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0]["delta"].get("content")
+                if not delta:
+                    continue
+                buffer += delta
+                
+                if "\n" in delta:
+                    *lines, buffer = buffer.split("\n")
+                    for line in lines:
+                        text = _format_segment(line, line_start, emitted)
+                        line_start = True
+                        if text:
+                            emitted = True
+                            yield text
+                
+                flush_at = _sentence_flush_point(buffer)
+                if flush_at:
+                    text = _format_segment(buffer[:flush_at], line_start, emitted)
+                    buffer = buffer[flush_at:]
+                    line_start = False
+                    if text:
+                        emitted = True
+                        yield text
+            
+            text = _format_segment(buffer, line_start, emitted)
+            if text:
+                yield text
     
-    def _execute_tools_concurrently(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """并发执行多个工具调用"""
-        print(f"🔧 [DEBUG] 开始并发执行 {len(tool_calls)} 个工具")
+    async def _execute_tools_concurrently(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """并发执行多个工具调用，结果顺序与 tool_calls 一致"""
+        logger.debug("开始并发执行 {} 个工具", len(tool_calls))
         
-        def execute_single_tool(tool_call):
+        async def execute_single_tool(tool_call):
             """执行单个工具的包装函数"""
             function_name = tool_call["function"]["name"]
-            function_args = json.loads(tool_call["function"]["arguments"])
-            tool_call_id = tool_call["id"]
-            
-            print(f"🔧 [DEBUG] 开始执行工具: {function_name}")
-            print(f"🔧 [DEBUG] 工具参数: {function_args}")
             
             try:
+                function_args = json.loads(tool_call["function"]["arguments"])
+                logger.debug("开始执行工具: {}，参数: {}", function_name, function_args)
+                
                 # 使用工具管理器执行工具
-                tool_result = self._tool_manager.execute_tool(function_name, function_args)
-                print(f"✅ [DEBUG] 工具 {function_name} 执行成功")
-                print(f"🔧 [DEBUG] 工具执行结果: {tool_result[:200]}...")
+                tool_result = await asyncio.wait_for(
+                    self._tool_manager.aexecute_tool(function_name, function_args),
+                    timeout=_TOOL_TIMEOUT,
+                )
+                logger.debug("工具执行结果: {}...", tool_result[:200])
+                
+                # 工具内部会捕获异常并返回 {"error": ...}，这类结果同样视为失败
+                success = not _is_error_result(tool_result)
+                if success:
+                    logger.debug("工具 {} 执行成功", function_name)
+                else:
+                    logger.warning("工具 {} 返回错误结果", function_name)
                 
                 return {
-                    "success": True,
+                    "success": success,
                     "content": tool_result,
                     "tool_name": function_name
                 }
-                
+            
+            except asyncio.TimeoutError:
+                logger.warning("工具 {} 执行超时", function_name)
+                return {
+                    "success": False,
+                    "content": f"工具 {function_name} 执行超时",
+                    "tool_name": function_name
+                }
             except Exception as tool_error:
-                print(f"ERROR [DEBUG] 工具 {function_name} 执行失败: {str(tool_error)}")
-                error_message = f"工具 {function_name} 执行失败: {str(tool_error)}"
-                
+                logger.error("工具 {} 执行失败: {}", function_name, tool_error)
                 return {
                     "success": False,
-                    "content": error_message,
+                    "content": f"工具 {function_name} 执行失败: {str(tool_error)}",
                     "tool_name": function_name
                 }
         
-        # 使用线程池并发执行工具
-        results = []
-        max_workers = min(len(tool_calls), 3)  # 限制并发数量
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有任务
-            future_to_tool = {executor.submit(execute_single_tool, tool_call): tool_call 
-                             for tool_call in tool_calls}
-            
-            # 收集结果（保持原始顺序）
-            for tool_call in tool_calls:
-                for future, original_tool_call in future_to_tool.items():
-                    if original_tool_call == tool_call:
-                        try:
-                            result = future.result(timeout=30)  # 30秒超时
-                            results.append(result)
-                            print(f"✅ [DEBUG] 工具 {result['tool_name']} 并发执行完成")
-                        except concurrent.futures.TimeoutError:
-                            print(f"⏰ [DEBUG] 工具 {tool_call['function']['name']} 执行超时")
-                            results.append({
-                                "success": False,
-                                "content": f"工具 {tool_call['function']['name']} 执行超时",
-                                "tool_name": tool_call['function']['name']
-                            })
-                        except Exception as e:
-                            print(f"ERROR [DEBUG] 工具 {tool_call['function']['name']} 并发执行异常: {str(e)}")
-                            results.append({
-                                "success": False,
-                                "content": f"工具 {tool_call['function']['name']} 执行异常: {str(e)}",
-                                "tool_name": tool_call['function']['name']
-                            })
-                        break
-        
-        print(f"🔧 [DEBUG] 并发执行完成，成功: {sum(1 for r in results if r['success'])}/{len(results)}")
-        return results
-
-    def _validate_and_clean_response(self, content: str) -> str:
-        """验证和清理响应内容，移除异常的工具调用标记和markdown格式"""
-        if not content:
-            return content
-        
-        original_length = len(content)
-        cleaned_content = content
-        
-        # 1. 移除异常的工具调用标记
-        tool_patterns = [
-            r'function\w+',  # functionget_weather 等
-            r'tool_call\w+',  # tool_call 相关
-            r'\{"tool_calls"',  # JSON 工具调用残留
-        ]
-        
-        for pattern in tool_patterns:
-            matches = re.findall(pattern, cleaned_content, re.IGNORECASE)
-            if matches:
-                print(f"🔧 [DEBUG] 检测到异常工具调用标记: {matches}")
-                cleaned_content = re.sub(pattern, '', cleaned_content, flags=re.IGNORECASE)
-        
-        # 2. 清理 markdown 格式
-        markdown_patterns = [
-            # 标题格式 (# ## ### 等)
-            (r'^#{1,6}\s+(.+)$', r'\1'),
-            # 粗体格式 (**text** 或 __text__)
-            (r'\*\*(.+?)\*\*', r'\1'),
-            (r'__(.+?)__', r'\1'),
-            # 斜体格式 (*text* 或 _text_)
-            (r'(?<!\*)\*([^*]+?)\*(?!\*)', r'\1'),
-            (r'(?<!_)_([^_]+?)_(?!_)', r'\1'),
-            # 代码块格式 (```code``` 或 `code`)
-            (r'```[\s\S]*?```', ''),
-            (r'`([^`]+?)`', r'\1'),
-            # 链接格式 [text](url)
-            (r'\[([^\]]+?)\]\([^\)]+?\)', r'\1'),
-            # 图片格式 ![alt](url)
-            (r'!\[[^\]]*?\]\([^\)]+?\)', ''),
-            # 列表格式 (- 或 * 或 数字.)
-            (r'^\s*[-*+]\s+', ''),
-            (r'^\s*\d+\.\s+', ''),
-            # 引用格式 (> text)
-            (r'^\s*>\s+(.+)$', r'\1'),
-            # 水平分割线
-            (r'^\s*[-*_]{3,}\s*$', ''),
-            # 表格分隔符
-            (r'\|', ' '),
-            # HTML标签
-            (r'<[^>]+>', ''),
+        # 模型偶尔会在同一轮中重复请求完全相同的调用，相同的调用只执行一次
+        unique_calls: Dict[tuple[str, str], Dict[str, Any]] = {}
+        for tool_call in tool_calls:
+            function = tool_call["function"]
+            unique_calls.setdefault((function["name"], function["arguments"]), tool_call)
+        unique_results = dict(zip(
+            unique_calls,
+            await asyncio.gather(*(execute_single_tool(tool_call) for tool_call in unique_calls.values())),
+        ))
+        results = [
+            unique_results[tool_call["function"]["name"], tool_call["function"]["arguments"]]
+            for tool_call in tool_calls
         ]
         
-        print(f"🔧 [DEBUG] 开始清理markdown格式...")
-        
-        # 按行处理，保持换行结构
-        lines = cleaned_content.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            cleaned_line = line
-            
-            # 应用所有markdown清理规则
-            for pattern, replacement in markdown_patterns:
-                if pattern.startswith('^') and pattern.endswith('$'):
-                    # 整行匹配的模式
-                    cleaned_line = re.sub(pattern, replacement, cleaned_line, flags=re.MULTILINE)
-                else:
-                    # 行内匹配的模式
-                    cleaned_line = re.sub(pattern, replacement, cleaned_line)
-            
-            # 清理多余空格但保留基本格式
-            cleaned_line = re.sub(r'\s+', ' ', cleaned_line).strip()
-            
-            # 保留非空行
-            if cleaned_line:
-                cleaned_lines.append(cleaned_line)
-        
-        # 重新组合内容
-        cleaned_content = '\n'.join(cleaned_lines)
-        
-        # 3. 最终清理
-        # 移除多余的换行符
-        cleaned_content = re.sub(r'\n{3,}', '\n\n', cleaned_content)
-        # 清理首尾空白
-        cleaned_content = cleaned_content.strip()
-        
-        # 4. 避免过度清理检查
-        if len(cleaned_content) < original_length * 0.2:  # 如果清理后内容少于原内容的20%
-            print(f"[DEBUG] 清理后内容过短({len(cleaned_content)}/{original_length})，保留原内容")
-            return content
-        
-        if cleaned_content != content:
-            print(f"🔧 [DEBUG] 内容已清理，长度: {original_length} -> {len(cleaned_content)}")
-            print(f"🔧 [DEBUG] 清理后预览: {cleaned_content[:100]}...")
-        
-        return cleaned_content if cleaned_content else content
+        logger.debug("并发执行完成，成功: {}/{}", sum(1 for r in results if r['success']), len(results))
+        return results
 
     def _chat_function_factory(
         self, chat_func: Callable[[List[Dict[str, Any]], str], AsyncIterator[str]]
@@ -535,13 +844,13 @@ class TravelAgent(AgentInterface):
         创建聊天管道，优先使用 DeepSeek Function Calling
         
         管道流程:
-        DeepSeek Function Calling -> sentence_divider -> actions_extractor -> display_processor -> tts_filter
+        DeepSeek Function Calling -> sentence_pipeline
+        (分句、动作提取、显示处理与 TTS 过滤在同一个生成器中完成)
         """
         
-        @tts_filter(self._tts_preprocessor_config)
-        @display_processor()
-        @actions_extractor(self._live2d_model)
-        @sentence_divider(
+        @sentence_pipeline(
+            live2d_model=self._live2d_model,
+            tts_preprocessor_config=self._tts_preprocessor_config,
             faster_first_response=self._faster_first_response,
             segment_method=self._segment_method,
             valid_tags=["think"],
@@ -558,65 +867,69 @@ class TravelAgent(AgentInterface):
             """
             
             user_input = self._to_text_prompt(input_data)
-            print(f"\n[DEBUG] 收到用户输入: {user_input}")
+            logger.debug("收到用户输入: {}", user_input)
             
             # 优先尝试 DeepSeek Function Calling
             # 让 AI 自动判断是否需要调用工具
-            print("[DEBUG] 开始处理用户请求...")
+            logger.debug("开始处理用户请求...")
+            response_chunks: List[str] = []
             try:
-                print("🔧 [DEBUG] 尝试使用 DeepSeek Function Calling...")
-                response = self._deepseek_function_call(user_input)
-                
-                # 检查是否成功调用了函数（通过响应内容判断）
-                if not response.startswith("ERROR"):
-                    # 成功使用 Function Calling，流式输出响应
-                    print("✅ [DEBUG] Function Calling 成功，开始流式输出...")
-                    for char in response:
-                        yield char
-                    
-                    # 存储到记忆
-                    self._add_message(user_input, "user")
-                    self._add_message(response, "assistant")
-                    print("✅ [DEBUG] 响应已存储到记忆中")
-                    return
-                else:
-                    # Function Calling 失败，记录日志但继续使用普通聊天
-                    print(f"[DEBUG] Function calling 不可用: {response}")
-                    logger.info(f"Function calling 不可用，使用普通聊天模式: {response}")
-                    
+                logger.debug("尝试使用 DeepSeek Function Calling...")
+                async for chunk in self._deepseek_function_call(user_input):
+                    yield chunk
+                    response_chunks.append(chunk)
+            except _FunctionCallUnavailable as e:
+                # Function Calling 失败，记录日志但继续使用普通聊天
+                logger.info("Function calling 不可用，使用普通聊天模式: {}", e)
             except Exception as e:
-                print(f"ERROR [DEBUG] Function calling 出错: {str(e)}")
-                logger.error(f"Function calling 出错，回退到普通聊天: {str(e)}")
+                if response_chunks:
+                    # 已经输出了部分回复，无法再回退，保留已输出的内容
+                    logger.error("Function calling 流式输出中断: {}", e)
+                else:
+                    logger.error("Function calling 出错，回退到普通聊天: {}", e)
+            
+            if response_chunks:
+                # 成功使用 Function Calling，存储到记忆
+                self._add_message(user_input, "user")
+                self._add_message("".join(response_chunks), "assistant")
+                logger.debug("响应已存储到记忆中")
+                return
             
             # 回退到普通聊天流程
-            print("[DEBUG] 回退到普通聊天流程...")
-            messages = self._to_messages(input_data)
+            logger.debug("回退到普通聊天流程...")
+            messages = self._to_messages(input_data, user_input)
             
             # 从 LLM 获取 token 流
-            print("[DEBUG] 调用普通 LLM 聊天接口...")
+            logger.debug("调用普通 LLM 聊天接口...")
             token_stream = chat_func(messages, self._system)
-            complete_response = ""
+            tokens: List[str] = []
             
             async for token in token_stream:
                 yield token
-                complete_response += token
+                tokens.append(token)
             
             # 存储完整响应
-            print(f"✅ [DEBUG] 普通聊天完成，响应长度: {len(complete_response)}")
+            complete_response = "".join(tokens)
+            logger.debug("普通聊天完成，响应长度: {}", len(complete_response))
             self._add_message(complete_response, "assistant")
         
         return chat_with_memory
 
-    def _to_messages(self, input_data: BatchInput) -> List[Dict[str, Any]]:
+    def _to_messages(
+        self, input_data: BatchInput, text_prompt: str | None = None
+    ) -> List[Dict[str, Any]]:
         """
         准备支持图像的消息列表
+
+        Args:
+            input_data: BatchInput
+            text_prompt: 已格式化的提示字符串，为 None 时从 input_data 重新生成
         """
-        messages = self._memory.copy()
+        if text_prompt is None:
+            text_prompt = self._to_text_prompt(input_data)
         
         if input_data.images:
-            content = []
-            text_content = self._to_text_prompt(input_data)
-            content.append({"type": "text", "text": text_content})
+            content = [{"type": "text", "text": text_prompt}]
             
             for img_data in input_data.images:
                 content.append({
@@ -626,14 +939,13 @@ class TravelAgent(AgentInterface):
             
             user_message = {"role": "user", "content": content}
         else:
-            user_message = {"role": "user", "content": self._to_text_prompt(input_data)}
+            user_message = {"role": "user", "content": text_prompt}
         
-        messages.append(user_message)
+        messages = [*self._memory, user_message]
         self._add_message(user_message["content"], "user")
         return messages
 
     async def chat(self, input_data: BatchInput) -> AsyncIterator[SentenceOutput]:
         """聊天方法"""
-        chat_func = self._create_chat_function()
-        async for output in chat_func(input_data):
+        async for output in self._chat_function(input_data):
             yield output
\ No newline at end of file
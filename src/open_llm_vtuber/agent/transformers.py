@@ -120,42 +120,13 @@ def tts_filter(
         @wraps(func)
         async def wrapper(*args, **kwargs) -> AsyncIterator[SentenceOutput]:
             sentence_stream = func(*args, **kwargs)
-            # 修改这一行，确保创建TTSPreprocessorConfig时提供所有必需的字段
-            if tts_preprocessor_config is None:
-                from ..config_manager.tts_preprocessor import TTSPreprocessorConfig, TranslatorConfig
-                
-                # 创建默认的translator_config
-                default_translator_config = TranslatorConfig(
-                    translate_audio=False,
-                    translate_provider="deeplx",
-                    deeplx=None,
-                    tencent=None
-                )
-                
-                # 创建默认的TTS预处理器配置
-                config = TTSPreprocessorConfig(
-                    remove_special_char=True,
-                    ignore_brackets=True,
-                    ignore_parentheses=True,
-                    ignore_asterisks=True,
-                    ignore_angle_brackets=True,
-                    translator_config=default_translator_config
-                )
-            else:
-                config = tts_preprocessor_config
+            config = tts_preprocessor_config or _default_tts_preprocessor_config()
 
             async for sentence, display, actions in sentence_stream:
                 if any(tag.name == "think" for tag in sentence.tags):
                     tts = ""
                 else:
-                    tts = filter_text(
-                        text=display.text,
-                        remove_special_char=config.remove_special_char,
-                        ignore_brackets=config.ignore_brackets,
-                        ignore_parentheses=config.ignore_parentheses,
-                        ignore_asterisks=config.ignore_asterisks,
-                        ignore_angle_brackets=config.ignore_angle_brackets,
-                    )
+                    tts = _filter_tts_text(display.text, config)
 
                 logger.debug(f"[{display.name}] display: {display.text}")
                 logger.debug(f"[{display.name}] tts: {tts}")
@@ -169,3 +140,105 @@ def tts_filter(
         return wrapper
 
     return decorator
+
+
+
+def _default_tts_preprocessor_config() -> TTSPreprocessorConfig:
+    """Build the TTS preprocessor config used when none is provided"""
+    from ..config_manager.tts_preprocessor import TranslatorConfig
+
+    return TTSPreprocessorConfig(
+        remove_special_char=True,
+        ignore_brackets=True,
+        ignore_parentheses=True,
+        ignore_asterisks=True,
+        ignore_angle_brackets=True,
+        translator_config=TranslatorConfig(
+            translate_audio=False,
+            translate_provider="deeplx",
+            deeplx=None,
+            tencent=None,
+        ),
+    )
+
+
+def _filter_tts_text(text: str, config: TTSPreprocessorConfig) -> str:
+    """Apply the TTS preprocessor config to a piece of display text"""
+    return filter_text(
+        text=text,
+        remove_special_char=config.remove_special_char,
+        ignore_brackets=config.ignore_brackets,
+        ignore_parentheses=config.ignore_parentheses,
+        ignore_asterisks=config.ignore_asterisks,
+        ignore_angle_brackets=config.ignore_angle_brackets,
+    )
+
+
+def sentence_pipeline(
+    live2d_model: Live2dModel,
+    tts_preprocessor_config: TTSPreprocessorConfig = None,
+    faster_first_response: bool = True,
+    segment_method: str = "pysbd",
+    valid_tags: List[str] = None,
+):
+    """
+    Decorator that turns a token stream into SentenceOutput in a single stage.
+
+    Equivalent to stacking tts_filter, display_processor, actions_extractor
+    and sentence_divider, but every sentence goes through one generator
+    frame instead of four nested ones.
+
+    Args:
+        live2d_model: Live2dModel - Model used to extract expressions
+        tts_preprocessor_config: TTSPreprocessorConfig - TTS filter settings
+        faster_first_response: bool - Whether to enable faster first response
+        segment_method: str - Method for sentence segmentation
+        valid_tags: List[str] - List of valid tags to process
+    """
+
+    def decorator(
+        func: Callable[..., AsyncIterator[str]],
+    ) -> Callable[..., AsyncIterator[SentenceOutput]]:
+        @wraps(func)
+        async def wrapper(*args, **kwargs) -> AsyncIterator[SentenceOutput]:
+            config = tts_preprocessor_config or _default_tts_preprocessor_config()
+            divider = SentenceDivider(
+                faster_first_response=faster_first_response,
+                segment_method=segment_method,
+                valid_tags=valid_tags or [],
+            )
+            token_stream = func(*args, **kwargs)
+            async for sentence in divider.process_stream(token_stream):
+                logger.debug(f"sentence_pipeline: {sentence}")
+                text = sentence.text
+                actions = Actions()
+                is_think = False
+                is_tag_boundary = False
+                for tag in sentence.tags:
+                    if tag.state in (TagState.START, TagState.END):
+                        is_tag_boundary = True
+                    if tag.name == "think":
+                        is_think = True
+                        if tag.state == TagState.START:
+                            text = "("
+                        elif tag.state == TagState.END:
+                            text = ")"
+
+                # Only extract emotions for non-tag text
+                if not is_tag_boundary:
+                    expressions = live2d_model.extract_emotion(sentence.text)
+                    if expressions:
+                        actions.expressions = expressions
+
+                display = DisplayText(text=text)
+                tts = "" if is_think else _filter_tts_text(text, config)
+
+                yield SentenceOutput(
+                    display_text=display,
+                    tts_text=tts,
+                    actions=actions,
+                )
+
+        return wrapper
+
+    return decorator
@@ -47,13 +47,10 @@ def init_webtool_routes(default_context_cache: ServiceContext) -> APIRouter:
         logger.info(f"收到图片上传请求: {file.filename}")
         
         try:
-            # 1. 验证文件
-            contents = await file.read()
-            is_valid, error_msg = image_service.validate_image_file(
-                file.content_type, len(contents)
-            )
+            # 1. 验证文件：检查文件头并分块读取，无效或过大的上传会被提前拒绝
+            contents, error_msg = await image_service.read_image_upload(file)
             
-            if not is_valid:
+            if contents is None:
                 return Response(
                     content=json.dumps({"error": error_msg}),
                     status_code=400,
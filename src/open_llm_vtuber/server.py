@@ -9,6 +9,7 @@ from starlette.responses import Response
 from .routes import init_client_ws_route, init_webtool_routes
 from .service_context import ServiceContext
 from .config_manager.utils import Config
+from .utils.http_client import close_http_client
 
 
 class CustomStaticFiles(StaticFiles):
@@ -40,6 +41,9 @@ class WebSocketServer:
             allow_headers=["*"],
         )
 
+        # Release the shared HTTP client's pooled connections on shutdown
+        self.app.add_event_handler("shutdown", close_http_client)
+
         # Load configurations and initialize the default context cache
         default_context_cache = ServiceContext()
         default_context_cache.load_from_config(config)
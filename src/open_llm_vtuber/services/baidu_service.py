@@ -1,8 +1,19 @@
 import os
-import requests
+import time
+import asyncio
+from urllib.parse import quote_from_bytes
 from loguru import logger
 from typing import Dict
 
+from ..utils.http_client import get_http_client
+
+# 令牌过期前提前刷新的时间（秒）
+_TOKEN_REFRESH_MARGIN = 60
+# 百度令牌默认有效期为 30 天
+_DEFAULT_TOKEN_TTL = 2592000
+# 访问令牌无效或过期的错误码
+_TOKEN_ERROR_CODES = {110, 111}
+
 class BaiduLandmarkService:
     """百度地标识别服务"""
     
@@ -10,51 +21,76 @@ class BaiduLandmarkService:
         self.api_key = os.getenv("BAIDU_API_KEY")
         self.secret_key = os.getenv("BAIDU_SECRET_KEY")
         self._access_token = None
+        self._token_expiry = 0.0
+        self._token_lock = asyncio.Lock()
     
     async def _get_access_token(self) -> str:
         """
         获取百度API访问令牌
+
+        令牌在有效期内缓存复用，并发请求只触发一次刷新。
         """
         if not self.api_key or not self.secret_key:
             raise Exception("未配置百度API密钥，请在.env文件中设置BAIDU_API_KEY和BAIDU_SECRET_KEY")
         
+        if self._access_token and time.monotonic() < self._token_expiry:
+            return self._access_token
+        
+        async with self._token_lock:
+            # 等待锁期间其他请求可能已经完成刷新
+            if self._access_token and time.monotonic() < self._token_expiry:
+                return self._access_token
+            return await self._refresh_access_token()
+    
+    async def _refresh_access_token(self) -> str:
+        """向百度请求新的访问令牌并缓存"""
         try:
             token_url = f"https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={self.api_key}&client_secret={self.secret_key}"
-            response = requests.get(token_url, timeout=10)
+            response = await get_http_client().get(token_url, timeout=10)
             result = response.json()
             
             access_token = result.get('access_token')
             if not access_token:
                 raise Exception("获取百度API访问令牌失败")
             
+            expires_in = result.get('expires_in', _DEFAULT_TOKEN_TTL)
+            self._access_token = access_token
+            self._token_expiry = time.monotonic() + expires_in - _TOKEN_REFRESH_MARGIN
             return access_token
             
         except Exception as e:
             logger.error(f"获取访问令牌失败: {str(e)}")
             raise
     
-    async def recognize_landmark(self, img_base64: str) -> Dict:
+    async def warm_up(self) -> None:
+        """
+        提前获取访问令牌，可与图片预处理并行执行
+
+        令牌已缓存时立即返回。
+        """
+        await self._get_access_token()
+    
+    async def recognize_landmark(self, img_base64: bytes) -> Dict:
         """
         识别地标
         
         Args:
-            img_base64: base64编码的图片
+            img_base64: base64编码的图片数据
             
         Returns:
             地标识别结果
         """
         try:
             access_token = await self._get_access_token()
+            result = await self._request_landmark(access_token, img_base64)
             
-            # 调用地标识别API
-            api_url = f"https://aip.baidubce.com/rest/2.0/image-classify/v1/landmark?access_token={access_token}"
-            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            payload = {'image': img_base64}
-            
-            response = requests.post(api_url, headers=headers, data=payload, timeout=15)
-            result = response.json()
-            
-            logger.info(f"百度API响应: {result}")
+            if result.get('error_code') in _TOKEN_ERROR_CODES:
+                # 缓存的令牌已失效，刷新后重试一次
+                logger.warning(f"百度访问令牌失效，重新获取: {result}")
+                if self._access_token == access_token:
+                    self._access_token = None
+                access_token = await self._get_access_token()
+                result = await self._request_landmark(access_token, img_base64)
             
             if 'error_code' in result:
                 logger.error(f"百度API错误: {result}")
@@ -64,4 +100,17 @@ class BaiduLandmarkService:
             
         except Exception as e:
             logger.error(f"地标识别异常: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    async def _request_landmark(self, access_token: str, img_base64: bytes) -> Dict:
+        """调用地标识别API"""
+        api_url = f"https://aip.baidubce.com/rest/2.0/image-classify/v1/landmark?access_token={access_token}"
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        # 直接由 base64 字节串构造表单请求体，不经过 str 中转
+        body = b"image=" + quote_from_bytes(img_base64, safe="").encode("ascii")
+        
+        response = await get_http_client().post(api_url, headers=headers, content=body, timeout=15)
+        result = response.json()
+        
+        logger.info(f"百度API响应: {result}")
+        return result
\ No newline at end of file
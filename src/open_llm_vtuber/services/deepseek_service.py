@@ -1,8 +1,10 @@
 import os
-import requests
+import httpx
 from loguru import logger
 from typing import Dict
 
+from ..utils.http_client import get_http_client
+
 class DeepSeekService:
     """DeepSeek AI讲解服务"""
     
@@ -105,7 +107,7 @@ class DeepSeekService:
             
             # 调用API
             logger.info("调用DeepSeek API")
-            response = requests.post(
+            response = await get_http_client().post(
                 self.base_url,
                 headers=headers,
                 json=data,
@@ -123,10 +125,10 @@ class DeepSeekService:
                 logger.error(f"DeepSeek API失败: {response.status_code} - {response.text}")
                 raise Exception(f"调用DeepSeek API失败: {response.status_code}")
                 
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             logger.warning("DeepSeek API超时")
             raise Exception("DeepSeek API连接超时，请稍后重试")
-        except requests.exceptions.RequestException as e:
+        except httpx.RequestError as e:
             logger.error(f"DeepSeek API请求错误: {str(e)}")
             raise Exception(f"DeepSeek API请求失败: {str(e)}")
         except Exception as e:
@@ -1,46 +1,108 @@
+import asyncio
 import base64
 import io
 from PIL import Image
 from loguru import logger
 
+# 常见图片格式的文件头（magic bytes）
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+# 识别文件头需要读取的字节数
+_SNIFF_BYTES = 12
+# 分块读取上传文件时每块的大小
+_UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 直接透传的 JPEG 最大体积，base64 编码后仍远小于百度接口 4MB 的限制
+_PASSTHROUGH_MAX_BYTES = 2 * 1024 * 1024
+# 感知哈希（dHash）的边长，得到 _DHASH_SIZE * _DHASH_SIZE 位的哈希值
+_DHASH_SIZE = 8
+
 class ImageService:
     """图片处理服务"""
     
     @staticmethod
-    async def process_image_for_api(image_data: bytes, max_size: int = 1024) -> str:
+    async def process_image_for_api(image_data: bytes, max_size: int = 1024) -> tuple[bytes, int]:
         """
-        处理图片：调整大小并转换为base64格式
+        处理图片：调整大小并转换为base64格式，同时计算感知哈希
+
+        解码、缩放与编码都是 CPU 密集操作，在线程池中执行以免阻塞事件循环；
+        感知哈希复用同一次解码的结果，不再单独解码图片。
         
         Args:
             image_data: 图片二进制数据
             max_size: 最大尺寸限制
             
         Returns:
-            base64编码的图片字符串
+            (base64编码的图片数据（ASCII 字节串，可直接写入请求体）, 64 位 dHash 值)
         """
         try:
-            # 打开图片
-            image = Image.open(io.BytesIO(image_data))
-            
-            # 转换为RGB格式
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 调整图片大小
-            if image.width > max_size or image.height > max_size:
-                image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # 转换为JPEG格式并编码为base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='JPEG', quality=85)
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            return img_base64
+            return await asyncio.to_thread(ImageService._process_image_sync, image_data, max_size)
             
         except Exception as e:
             logger.error(f"图片处理失败: {str(e)}")
             raise Exception(f"图片处理失败: {str(e)}")
     
+    @staticmethod
+    def _process_image_sync(image_data: bytes, max_size: int) -> tuple[bytes, int]:
+        """同步执行图片的解码、缩放与 JPEG 编码，并由解码后的图片计算 dHash"""
+        # 打开图片（只读取文件头，像素数据在需要时才解码）
+        image = Image.open(io.BytesIO(image_data))
+        
+        # 尺寸与体积已经合适的 RGB JPEG 直接使用原始数据，省去解码和重新编码
+        if (
+            image.format == 'JPEG'
+            and image.mode == 'RGB'
+            and image.width <= max_size
+            and image.height <= max_size
+            and len(image_data) <= _PASSTHROUGH_MAX_BYTES
+        ):
+            # 哈希只需要极小的灰度图，以最大缩放比例解码为灰度，这是该路径唯一的一次解码
+            image.draft('L', (_DHASH_SIZE * 8, _DHASH_SIZE * 8))
+            return base64.b64encode(image_data), ImageService._dhash(image)
+        
+        # JPEG 在解码时由 libjpeg 按 1/2、1/4、1/8 缩放，大图不必先解码到原始分辨率
+        if image.format == 'JPEG':
+            image.draft('RGB', (max_size, max_size))
+        
+        # 转换为RGB格式
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # 调整图片大小
+        if image.width > max_size or image.height > max_size:
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        
+        # 由缩放后的图片计算哈希，不再重新解码
+        image_hash = ImageService._dhash(image)
+        
+        # 转换为JPEG格式并编码为base64
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        # getbuffer 直接引用缓冲区内容，避免 getvalue 的一次复制
+        return base64.b64encode(buffer.getbuffer()), image_hash
+    
+    @staticmethod
+    def _dhash(image: Image.Image) -> int:
+        """
+        计算图片的差值感知哈希（dHash）：缩小为灰度图后比较每行相邻像素的亮度
+
+        同一景物的相似照片哈希值的汉明距离很小，可用于近似重复图片的识别。
+        """
+        row_size = _DHASH_SIZE + 1
+        image = image.convert('L').resize((row_size, _DHASH_SIZE), Image.Resampling.BOX)
+        pixels = image.tobytes()
+        
+        value = 0
+        for offset in range(0, row_size * _DHASH_SIZE, row_size):
+            for x in range(offset, offset + _DHASH_SIZE):
+                value = (value << 1) | (pixels[x] < pixels[x + 1])
+        return value
+    
     @staticmethod
     def validate_image_file(content_type: str, file_size: int, max_size_mb: int = 5) -> tuple[bool, str]:
         """
@@ -60,4 +122,72 @@ class ImageService:
         if file_size > max_size_mb * 1024 * 1024:
             return False, f"图片文件过大，请上传小于{max_size_mb}MB的图片"
         
-        return True, ""
\ No newline at end of file
+        return True, ""
+    
+    @staticmethod
+    def sniff_image_type(header: bytes) -> str | None:
+        """
+        根据文件头识别图片格式
+        
+        Args:
+            header: 文件开头至少 12 个字节
+            
+        Returns:
+            图片的 MIME 类型，无法识别时返回 None
+        """
+        for signature, mime_type in _IMAGE_SIGNATURES:
+            if header.startswith(signature):
+                return mime_type
+        if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+            return "image/webp"
+        return None
+    
+    @staticmethod
+    def is_supported_image(image_data: bytes) -> bool:
+        """
+        判断 PIL 能否识别图片数据（只解析文件头，不解码像素）
+        
+        用于文件头不在常见格式列表中的上传，例如 TIFF。
+        """
+        try:
+            with Image.open(io.BytesIO(image_data)):
+                return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    async def read_image_upload(file, max_size_mb: int = 5) -> tuple[bytes | None, str]:
+        """
+        分块读取并验证上传的图片
+        
+        先检查声明的类型，再分块读取，超出大小限制时立即停止，
+        不会为过大的上传分配完整的内存。常见格式根据文件头直接确认，
+        其他格式读取完成后交给 PIL 识别，PIL 能打开的格式都可以上传。
+        
+        Args:
+            file: 上传文件对象（提供 content_type 与异步 read 方法）
+            max_size_mb: 最大文件大小（MB）
+            
+        Returns:
+            (图片数据, 错误信息)，验证失败时图片数据为 None
+        """
+        content_type = file.content_type or ""
+        header = await file.read(_SNIFF_BYTES)
+        is_valid, error_msg = ImageService.validate_image_file(content_type, len(header), max_size_mb)
+        if not is_valid:
+            return None, error_msg
+        sniffed = ImageService.sniff_image_type(header) is not None
+        
+        chunks = [header]
+        total_size = len(header)
+        while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+            total_size += len(chunk)
+            is_valid, error_msg = ImageService.validate_image_file(content_type, total_size, max_size_mb)
+            if not is_valid:
+                return None, error_msg
+            chunks.append(chunk)
+        
+        image_data = b"".join(chunks)
+        if not sniffed and not ImageService.is_supported_image(image_data):
+            return None, "请上传图片文件"
+        return image_data, ""
@@ -1,10 +1,48 @@
 import json
+import asyncio
+import hashlib
+import functools
+import contextlib
 from typing import Dict, Any
 from loguru import logger
+from starlette.websockets import WebSocketDisconnect
 from ..conversations.conversation_handler import handle_conversation_trigger
+from ..utils.ttl_cache import TTLCache
 from .image_service import ImageService
 from .baidu_service import BaiduLandmarkService
 
+# 广播地标结果时每批并发发送的客户端数，以及单个客户端的发送超时（秒）
+_BROADCAST_BATCH_SIZE = 50
+_SEND_TIMEOUT = 5.0
+# 向已断开或已关闭的连接发送时可能出现的异常
+_SEND_ERRORS = (WebSocketDisconnect, RuntimeError, OSError)
+# 地标识别结果缓存：相同图片在有效期内直接复用识别结果，不再调用百度 API
+_LANDMARK_CACHE_SIZE = 256
+_LANDMARK_CACHE_TTL = 3600
+# 感知哈希的汉明距离不超过该值时视为同一景物的相似照片，复用识别结果
+_SIMILAR_IMAGE_MAX_DISTANCE = 4
+# 超过该大小的图片在线程池中计算摘要，避免阻塞事件循环（blake2b 计算时会释放 GIL）
+_INLINE_DIGEST_MAX_BYTES = 256 * 1024
+
+
+# 地标讲解的用户输入模板，模块加载时构建一次
+_USER_MESSAGE_TEMPLATE = """
+            我刚刚上传了一张图片，识别出的地标是：{landmark_name}。请为我介绍这个地标的历史背景、文化意义、建筑特色和实用建议。
+            禁止输出 # 号，禁止输出 markdown 格式, 以一两段自然段的形式回复。
+            """
+
+
+@functools.lru_cache(maxsize=512)
+def _build_user_message(landmark_name: str) -> str:
+    """构建地标讲解的用户输入，相同地标复用同一个字符串"""
+    return _USER_MESSAGE_TEMPLATE.format(landmark_name=landmark_name)
+
+
+def _image_digest(image_data: bytes) -> bytes:
+    """计算图片内容摘要，作为识别结果缓存的键"""
+    return hashlib.blake2b(image_data, digest_size=16).digest()
+
+
 class TravelAgentService:
     """旅游助手服务 - 整合图片识别和AI讲解"""
     
@@ -12,6 +50,10 @@ class TravelAgentService:
         self.image_service = ImageService()
         self.baidu_service = BaiduLandmarkService()
         self.websocket_handler = websocket_handler
+        # 图片摘要 -> 识别结果
+        self._landmark_cache = TTLCache(maxsize=_LANDMARK_CACHE_SIZE, ttl=_LANDMARK_CACHE_TTL)
+        # 图片感知哈希 -> 识别结果，用于识别内容相似但字节不同的上传
+        self._similar_landmark_cache = TTLCache(maxsize=_LANDMARK_CACHE_SIZE, ttl=_LANDMARK_CACHE_TTL)
     
     async def process_landmark_image(self, image_data: bytes) -> Dict[str, Any]:
         """
@@ -24,13 +66,31 @@ class TravelAgentService:
             包含识别结果的字典
         """
         try:
-            # 1. 处理图片
-            logger.info("开始处理图片")
-            processed_image = await self.image_service.process_image_for_api(image_data)
-            
-            # 2. 调用百度识图API
-            logger.info("调用百度地标识别API")
-            landmark_result = await self.baidu_service.recognize_landmark(processed_image)
+            # 相同的上传内容直接复用识别结果，同时跳过图片处理与百度API调用
+            if len(image_data) > _INLINE_DIGEST_MAX_BYTES:
+                cache_key = await asyncio.to_thread(_image_digest, image_data)
+            else:
+                cache_key = _image_digest(image_data)
+            landmark_result = self._landmark_cache.get(cache_key)
+            if landmark_result is not None:
+                logger.info("命中地标识别缓存，跳过百度API调用")
+            else:
+                # 1. 处理图片并计算感知哈希，同时预先获取百度访问令牌，两者重叠进行
+                logger.info("开始处理图片")
+                (processed_image, image_hash), _ = await asyncio.gather(
+                    self.image_service.process_image_for_api(image_data),
+                    self.baidu_service.warm_up(),
+                )
+                
+                landmark_result = self._find_similar_landmark(image_hash)
+                if landmark_result is not None:
+                    logger.info("命中相似图片的地标识别缓存，跳过百度API调用")
+                else:
+                    # 2. 调用百度识图API
+                    logger.info("调用百度地标识别API")
+                    landmark_result = await self.baidu_service.recognize_landmark(processed_image)
+                    self._similar_landmark_cache.set(image_hash, landmark_result)
+                self._landmark_cache.set(cache_key, landmark_result)
             
             # 3. 提取地标名称
             landmark_name = self._extract_landmark_name(landmark_result)
@@ -46,26 +106,37 @@ class TravelAgentService:
             }
             
         except Exception as e:
-            logger.error(f"处理地标图片失败: {str(e)}")
+            logger.error("处理地标图片失败: {}", e)
             return {
                 "success": False,
                 "error": str(e),
                 "message": "地标识别失败"
             }
     
+    def _find_similar_landmark(self, image_hash: int) -> Dict | None:
+        """
+        查找与图片感知哈希相近的识别结果
+        
+        缓存容量很小，逐条比较汉明距离即可。
+        """
+        for cached_hash, result in self._similar_landmark_cache.items():
+            if (cached_hash ^ image_hash).bit_count() <= _SIMILAR_IMAGE_MAX_DISTANCE:
+                return result
+        return None
+    
     def _extract_landmark_name(self, landmark_result: Dict) -> str:
         """
         从识别结果中提取地标名称
         """
+        # 百度API返回格式：{"result": {"landmark": ...}}，最常见，优先直接取值
         try:
-            if 'result' in landmark_result:
-                result = landmark_result['result']
-                if isinstance(result, dict) and 'landmark' in result:
-                    return result['landmark']
-                elif isinstance(result, list) and result:
-                    return result[0].get('name', '未知地标')
-            return '未知地标'
-        except Exception:
+            return landmark_result['result']['landmark']
+        except (KeyError, IndexError, TypeError):
+            pass
+        # 其他可能的格式：{"result": [{"name": ...}, ...]}
+        try:
+            return landmark_result['result'][0].get('name', '未知地标')
+        except (KeyError, IndexError, TypeError, AttributeError):
             return '未知地标'
     
     async def _trigger_landmark_conversation(self, landmark_name: str, landmark_result: Dict):
@@ -73,71 +144,158 @@ class TravelAgentService:
         通过对话系统触发地标讲解，实现流式输出和历史记录保存
         """
         try:
-            if not self.websocket_handler or not self.websocket_handler.client_connections:
+            # 先取连接快照并据此判断是否需要处理，避免迭代期间连接表被修改；
+            # 没有客户端时不做任何准备工作
+            handler = self.websocket_handler
+            connections = list(handler.client_connections.items()) if handler else None
+            if not connections:
                 logger.warning("没有活跃的WebSocket连接")
                 return
             
             # 构建用户输入消息，包含地标信息
-            user_message = f"""
-            我刚刚上传了一张图片，识别出的地标是：{landmark_name}。请为我介绍这个地标的历史背景、文化意义、建筑特色和实用建议。
-            禁止输出 # 号，禁止输出 markdown 格式, 以一两段自然段的形式回复。
-            """
+            user_message = _build_user_message(landmark_name)
+            # 输入数据对所有客户端相同且只会被读取，构建一次后共享
+            data = {
+                "text": user_message,
+                "images": None  # 图片已经在batch_input中处理
+            }
             
-            # 为每个连接的客户端触发对话
-            for client_uid, websocket in self.websocket_handler.client_connections.items():
-                try:
-                    context = self.websocket_handler.client_contexts[client_uid]
-                    
-                    # 通过正常的对话处理流程触发
-                    await handle_conversation_trigger(
-                        msg_type="text-input",
-                        data={
-                            "text": user_message,
-                            "images": None  # 图片已经在batch_input中处理
-                        },
-                        client_uid=client_uid,
-                        context=context,
-                        websocket=websocket,
-                        client_contexts=self.websocket_handler.client_contexts,
-                        client_connections=self.websocket_handler.client_connections,
-                        chat_group_manager=self.websocket_handler.chat_group_manager,
-                        received_data_buffers=self.websocket_handler.received_data_buffers,
-                        current_conversation_tasks=self.websocket_handler.current_conversation_tasks,
-                        broadcast_to_group=self.websocket_handler.broadcast_to_group,
-                    )
-                    
-                    logger.info(f"已为客户端 {client_uid} 触发地标讲解对话")
-                    
-                except Exception as e:
-                    logger.error(f"为客户端 {client_uid} 触发对话失败: {str(e)}")
+            # 对话处理需要的连接状态对所有客户端相同，只从 websocket_handler 读取一次
+            handler_state = {
+                "client_contexts": handler.client_contexts,
+                "client_connections": handler.client_connections,
+                "chat_group_manager": handler.chat_group_manager,
+                "received_data_buffers": handler.received_data_buffers,
+                "current_conversation_tasks": handler.current_conversation_tasks,
+                "broadcast_to_group": handler.broadcast_to_group,
+            }
+            
+            # 为每个连接的客户端并发触发对话
+            await asyncio.gather(
+                *(
+                    self._trigger_client_conversation(client_uid, websocket, data, handler_state)
+                    for client_uid, websocket in connections
+                )
+            )
             
         except Exception as e:
-            logger.error(f"触发地标对话失败: {str(e)}")
+            logger.error("触发地标对话失败: {}", e)
             raise
     
+    async def _trigger_client_conversation(
+        self, client_uid: str, websocket, data: Dict[str, Any], handler_state: Dict[str, Any]
+    ):
+        """
+        为单个客户端触发地标讲解对话，失败只记录日志，不影响其他客户端
+        """
+        try:
+            context = handler_state["client_contexts"][client_uid]
+            
+            # 通过正常的对话处理流程触发
+            await handle_conversation_trigger(
+                msg_type="text-input",
+                data=data,
+                client_uid=client_uid,
+                context=context,
+                websocket=websocket,
+                **handler_state,
+            )
+            
+            logger.info("已为客户端 {} 触发地标讲解对话", client_uid)
+            
+        except Exception as e:
+            logger.error("为客户端 {} 触发对话失败: {}", client_uid, e)
+    
     async def send_landmark_result_to_clients(self, landmark_info: str):
         """
         发送地标识别结果给所有客户端（保留兼容性）
         注意：建议使用_trigger_landmark_conversation来获得更好的用户体验
         """
         try:
-            if not self.websocket_handler or not self.websocket_handler.client_connections:
+            handler = self.websocket_handler
+            connections = list(handler.client_connections.items()) if handler else None
+            if not connections:
                 logger.warning("没有活跃的WebSocket连接")
                 return
                 
-            # 发送简单的文本消息
-            for client_uid, websocket in self.websocket_handler.client_connections.items():
-                try:
-                    await websocket.send_text(json.dumps({
-                        "type": "landmark_recognition_result",
-                        "message": landmark_info
-                    }))
-                    
-                    logger.info(f"地标信息已发送给客户端 {client_uid}")
-                    
-                except Exception as e:
-                    logger.error(f"发送地标信息给客户端 {client_uid} 失败: {str(e)}")
+            # 消息内容对所有客户端相同，只序列化一次
+            # 保留中文原文，避免 \uXXXX 转义使消息体积翻倍
+            payload = json.dumps({
+                "type": "landmark_recognition_result",
+                "message": landmark_info
+            }, ensure_ascii=False)
             
+            # 分批并发发送，慢客户端受超时限制，不会拖慢其他客户端；
+            # 每批结束后让出事件循环，避免大量客户端时阻塞其他请求
+            failed = []
+            broken = []
+            for start in range(0, len(connections), _BROADCAST_BATCH_SIZE):
+                if start:
+                    await asyncio.sleep(0)
+                batch = connections[start:start + _BROADCAST_BATCH_SIZE]
+                results = await asyncio.gather(
+                    *(
+                        self._send_to_client(client_uid, websocket, payload)
+                        for client_uid, websocket in batch
+                    )
+                )
+                for connection, (_, ok, connection_broken) in zip(batch, results):
+                    if not ok:
+                        failed.append(connection)
+                    if connection_broken:
+                        broken.append(connection)
+            
+            if failed:
+                logger.warning(
+                    "{} 个客户端未收到地标信息: {}",
+                    len(failed), [client_uid for client_uid, _ in failed],
+                )
+            if broken:
+                # 只清理已断开的连接，之后的广播不再重复尝试；
+                # 仅超时的慢客户端可能仍然在线，保留其连接
+                await asyncio.gather(
+                    *(self._reap_connection(client_uid, websocket) for client_uid, websocket in broken)
+                )
+            
+        except Exception as e:
+            logger.error("发送地标结果失败: {}", e)
+            raise
+    
+    async def _send_to_client(self, client_uid: str, websocket, payload: str) -> tuple[str, bool, bool]:
+        """
+        向单个客户端发送消息
+        
+        Returns:
+            (客户端 ID, 是否发送成功, 连接是否已断开)
+        """
+        try:
+            await asyncio.wait_for(websocket.send_text(payload), timeout=_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error("发送地标信息给客户端 {} 超时", client_uid)
+            return client_uid, False, False
+        except _SEND_ERRORS as e:
+            logger.error("发送地标信息给客户端 {} 失败: {}", client_uid, e)
+            return client_uid, False, True
+        
+        logger.info("地标信息已发送给客户端 {}", client_uid)
+        return client_uid, True, False
+    
+    async def _reap_connection(self, client_uid: str, websocket) -> None:
+        """
+        清理已断开的连接
+        
+        连接已被移除或已被同一客户端的新连接替换时跳过，避免与连接生命周期代码重复清理。
+        """
+        handler = self.websocket_handler
+        if handler.client_connections.get(client_uid) is not websocket:
+            return
+        
+        logger.info("移除已断开的客户端连接 {}", client_uid)
+        try:
+            await handler.handle_disconnect(client_uid)
         except Exception as e:
-            logger.error(f"发送地标结果失败: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("清理客户端 {} 的连接失败: {}", client_uid, e)
+        
+        # 关闭连接，使该连接的消息接收循环退出；连接可能已经断开
+        with contextlib.suppress(*_SEND_ERRORS):
+            await websocket.close()
@@ -0,0 +1,23 @@
+import httpx
+
+# 全局共享的异步 HTTP 客户端：百度、DeepSeek 服务以及旅游助手与其工具都通过它发送请求，
+# 复用 keep-alive 连接；各调用方按需在请求上指定超时时间
+_client: httpx.AsyncClient | None = None
+# 连接池上限：保留足够的空闲连接，避免并发识别时反复进行 TCP/TLS 握手
+_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的 httpx.AsyncClient，首次使用时创建"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(15.0), limits=_LIMITS)
+    return _client
+
+
+async def close_http_client() -> None:
+    """关闭共享客户端并释放连接池，在服务器关闭时调用"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
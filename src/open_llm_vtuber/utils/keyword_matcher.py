@@ -0,0 +1,62 @@
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+
+class KeywordMatcher:
+    """
+    Multi-pattern substring matcher that does not use regular expressions.
+
+    Patterns are bucketed by length. A scan looks up, at every position of
+    the text, one slice per distinct pattern length in a dict, so the cost is
+    O(len(text) * number of distinct lengths) with no backtracking. For short
+    keyword lists (city names, intent words) this is a single cheap pass.
+
+    Matching is case-insensitive. Each pattern maps to a value, which
+    defaults to the pattern itself, so aliases can share one canonical value.
+    Values may be any hashable object, e.g. (category, name) tuples, so one
+    matcher can recognise several keyword categories in a single scan.
+    """
+
+    __slots__ = ("_patterns", "_lengths")
+
+    def __init__(self, patterns: Iterable[str] | Dict[str, Any]):
+        if isinstance(patterns, dict):
+            items = patterns.items()
+        else:
+            items = ((pattern, pattern) for pattern in patterns)
+        self._patterns: Dict[str, Any] = {
+            pattern.lower(): value for pattern, value in items if pattern
+        }
+        # Longest first, so the longest pattern wins at a given position
+        self._lengths: Tuple[int, ...] = tuple(
+            sorted({len(pattern) for pattern in self._patterns}, reverse=True)
+        )
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, Any]]:
+        """
+        Yield (start index, value) for every match, left to right.
+
+        At each position only the longest matching pattern is reported.
+        """
+        text = text.lower()
+        patterns = self._patterns
+        lengths = self._lengths
+        text_len = len(text)
+        for start in range(text_len):
+            for length in lengths:
+                end = start + length
+                if end > text_len:
+                    continue
+                value = patterns.get(text[start:end])
+                if value is not None:
+                    yield start, value
+                    break
+
+    def find_first(self, text: str) -> Optional[Any]:
+        """Return the value of the leftmost match, or None"""
+        for _, value in self.iter_matches(text):
+            return value
+        return None
+
+    def contains(self, text: str) -> bool:
+        """Return whether any pattern occurs in text"""
+        return self.find_first(text) is not None
@@ -45,6 +45,12 @@ ABBREVIATIONS = [
     "Dr.",
 ]
 
+# Every comma and end punctuation mark starts with one of these characters,
+# so a single character-class search detects any of them
+_PUNCTUATION_PATTERN = re.compile(
+    "[" + "".join(re.escape(char) for char in sorted({p[0] for p in COMMAS + END_PUNCTUATIONS})) + "]"
+)
+
 # Set of languages directly supported by pysbd
 SUPPORTED_LANGUAGES = {
     "am",
@@ -151,10 +157,7 @@ def has_punctuation(text: str) -> bool:
     Returns:
         bool: Whether the text is a punctuation mark
     """
-    for punct in COMMAS + END_PUNCTUATIONS:
-        if punct in text:
-            return True
-    return False
+    return _PUNCTUATION_PATTERN.search(text) is not None
 
 
 def contains_end_punctuation(text: str) -> bool:
@@ -320,6 +323,14 @@ class SentenceDivider:
         self._buffer = ""
         # Replace active_tags dict with a stack to handle nesting
         self._tag_stack = []
+        self._tag_pattern = (
+            re.compile("|".join(f"{re.escape(tag)}/?>" for tag in self.valid_tags))
+            if self.valid_tags
+            else None
+        )
+        # A tag may be split across segments, so scans start this many
+        # characters before the newly appended text
+        self._scan_overlap = max((len(tag) for tag in self.valid_tags), default=0) + 1
 
     def _get_current_tags(self) -> List[TagInfo]:
         """
@@ -536,21 +547,24 @@ class SentenceDivider:
             SentenceWithTags: Complete sentences with their tag information
         """
         self._full_response = []
+        # Start of the buffer region not yet known to be free of triggers
+        scan_from = 0
 
         async for segment in segment_stream:
             self._buffer += segment
             self._full_response.append(segment)
 
             # Process buffer after punctuation, when buffer gets too long,
-            # or when we see a tag
-            should_process = any(
-                re.search(f"{tag}(?:/)?>", self._buffer) for tag in self.valid_tags
-            ) or has_punctuation(self._buffer)
-
-            if should_process:
+            # or when we see a tag. Text before scan_from was already checked,
+            # so only the new tail is scanned for each token.
+            if self._has_trigger(self._buffer[scan_from:]):
                 sentences = await self._process_buffer()
                 for sentence in sentences:
                     yield sentence
+                # The buffer was rewritten, check all of it on the next segment
+                scan_from = 0
+            else:
+                scan_from = max(0, len(self._buffer) - self._scan_overlap)
 
         # Process remaining text at end of stream
         if self._buffer.strip():
@@ -578,6 +592,12 @@ class SentenceDivider:
                     tags=current_tags or [TagInfo("", TagState.NONE)],
                 )
 
+    def _has_trigger(self, text: str) -> bool:
+        """Check if text contains punctuation or a valid tag"""
+        if has_punctuation(text):
+            return True
+        return self._tag_pattern is not None and self._tag_pattern.search(text) is not None
+
     @property
     def complete_response(self) -> str:
         """Get the complete response accumulated so far"""
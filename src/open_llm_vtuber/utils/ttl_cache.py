@@ -0,0 +1,48 @@
+import threading
+import time
+from typing import Any, Dict, List
+
+
+class TTLCache:
+    """
+    带过期时间的简单内存缓存
+
+    用于缓存外部接口的查询结果，超出容量时淘汰最早写入的条目。
+    工具在线程池中并发执行，读写都在锁内进行，可在任意线程中使用。
+    """
+    
+    __slots__ = ("_data", "_maxsize", "_ttl", "_lock")
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self._data: Dict[Any, tuple[float, Any]] = {}
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._lock = threading.Lock()
+    
+    def get(self, key: Any) -> Any:
+        """获取未过期的缓存值，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            return value
+    
+    def set(self, key: Any, value: Any) -> None:
+        """写入缓存值"""
+        with self._lock:
+            if key not in self._data and len(self._data) >= self._maxsize:
+                self._data.pop(next(iter(self._data)), None)
+            self._data[key] = (time.monotonic() + self._ttl, value)
+    
+    def items(self) -> List[tuple[Any, Any]]:
+        """返回所有未过期的 (键, 值)，按写入顺序排列，顺带清理已过期的条目"""
+        with self._lock:
+            now = time.monotonic()
+            expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+            for key in expired:
+                del self._data[key]
+            return [(key, value) for key, (_, value) in self._data.items()]